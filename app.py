@@ -1,24 +1,116 @@
-from flask import Flask, session, redirect, render_template, request, jsonify, url_for
+from flask import Flask, Response, g, has_request_context, session, redirect, render_template, request, jsonify, url_for
 from werkzeug.security import generate_password_hash, check_password_hash
+from abc import abstractmethod
+import atexit
+import bisect
+import functools
+import gzip
+import hashlib
 import json
 from authlib.integrations.flask_client import OAuth
 import sqlite3
 import os
 import math
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_session import Session
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
 import re
+import threading
+import time
+import heapq
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
 load_dotenv()
 
+try:
+    import numpy as np
+except ImportError:  # optional, haversine_many() falls back to pure Python
+    np = None
+
 app = Flask(__name__)
 
 # --- Session config ---
 app.secret_key = os.getenv("SECRET_KEY", "dev-secret-change-in-prod")
 app.config["SESSION_TYPE"] = "filesystem"
 app.config["SESSION_PERMANENT"] = False
-Session(app)
+# SESSION_BACKEND picks the server-side store: "filesystem" (Flask-Session files),
+# "sqlite" (SESSION_DB_PATH, WAL, shared by every worker on the host) or "memory"
+# (per-process dict, only for a single worker). sqlite/memory write a session only when
+# it changed or is past half its lifetime, and sweep expired rows every SESSION_SWEEP_INTERVAL_S.
+app.config["SESSION_BACKEND"] = os.getenv("SESSION_BACKEND", "filesystem").lower()
+app.config["SESSION_DB_PATH"] = os.getenv("SESSION_DB_PATH", os.path.join(os.path.dirname(__file__), "sessions.db"))
+app.config["SESSION_SWEEP_INTERVAL_S"] = float(os.getenv("SESSION_SWEEP_INTERVAL_S", "300"))
+
+# --- Database config ---
+# DB_POOL_SIZE is the number of idle connections kept per worker process; size it
+# to the thread count of the server (gunicorn --threads, waitress threads, ...).
+# Each worker process gets its own pool, WAL lets them read while one writes.
+app.config["DB_PATH"] = os.getenv("DB_PATH", os.path.join(os.path.dirname(__file__), "recycling.db"))
+app.config["DB_POOL_SIZE"] = int(os.getenv("DB_POOL_SIZE", "8"))
+app.config["DB_JOURNAL_MODE"] = os.getenv("DB_JOURNAL_MODE", "WAL").upper()
+app.config["DB_SYNCHRONOUS"] = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+app.config["DB_BUSY_TIMEOUT_MS"] = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+app.config["DB_CACHE_SIZE_KB"] = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))
+# Apply pending schema migrations at import. Set DB_AUTO_MIGRATE=0 when a deploy step runs
+# `flask migrate` before the workers start, so they never contend for the schema lock.
+app.config["DB_AUTO_MIGRATE"] = os.getenv("DB_AUTO_MIGRATE", "1") not in ("0", "false", "no", "")
+# How often (seconds) in-memory catalog indexes check whether items changed in another process.
+app.config["ITEM_INDEX_RECHECK_S"] = float(os.getenv("ITEM_INDEX_RECHECK_S", "5"))
+# lookup_item_info() cache: max entries and time-to-live in seconds (0 = no expiry).
+app.config["LOOKUP_CACHE_SIZE"] = int(os.getenv("LOOKUP_CACHE_SIZE", "2048"))
+app.config["LOOKUP_CACHE_TTL_S"] = float(os.getenv("LOOKUP_CACHE_TTL_S", "600"))
+# CSV (optionally gzipped) of zip,lat,lon centroids used to place users and listings that only
+# give a ZIP code; the bundled file covers the US. Empty disables the lookup.
+app.config["ZIP_CENTROIDS_PATH"] = os.getenv(
+    "ZIP_CENTROIDS_PATH", os.path.join(os.path.dirname(__file__), "data", "zip_centroids.csv.gz"))
+# Optional JSON file {"hazardous": [...], "ewaste": [...], "compost": [...], "recycle": [...]}
+# whose keywords are added to the built-in heuristic_classify() lists.
+app.config["CLASSIFY_KEYWORDS_PATH"] = os.getenv("CLASSIFY_KEYWORDS_PATH", "")
+# Per-user match candidate queues: cards kept per user and filter set, how long a queue
+# may be served before it is rebuilt (new listings from other workers show up within
+# this bound), how many users and filter sets per user are tracked, refill threads and
+# the max ?batch= size.
+app.config["MATCH_QUEUE_SIZE"] = int(os.getenv("MATCH_QUEUE_SIZE", "40"))
+app.config["MATCH_QUEUE_TTL_S"] = float(os.getenv("MATCH_QUEUE_TTL_S", "60"))
+app.config["MATCH_QUEUE_MAX_USERS"] = int(os.getenv("MATCH_QUEUE_MAX_USERS", "10000"))
+app.config["MATCH_QUEUE_MAX_FILTERS"] = int(os.getenv("MATCH_QUEUE_MAX_FILTERS", "8"))
+app.config["MATCH_QUEUE_WORKERS"] = int(os.getenv("MATCH_QUEUE_WORKERS", "2"))
+app.config["MATCH_BATCH_MAX"] = int(os.getenv("MATCH_BATCH_MAX", "20"))
+# Candidate scoring: how many rows are scored per fill (newest / closest first), the
+# recency half-life, and the weights of the score components (see score_candidates()).
+app.config["MATCH_SCORE_WINDOW"] = int(os.getenv("MATCH_SCORE_WINDOW", "200"))
+app.config["MATCH_RECENCY_HALF_LIFE_DAYS"] = float(os.getenv("MATCH_RECENCY_HALF_LIFE_DAYS", "14"))
+app.config["MATCH_SCORE_WEIGHTS"] = os.getenv("MATCH_SCORE_WEIGHTS", "distance=0.4,recency=0.25,text=0.2,intent=0.15")
+# Max decisions accepted by one POST /api/match/swipes.
+app.config["MATCH_SWIPE_BATCH_MAX"] = int(os.getenv("MATCH_SWIPE_BATCH_MAX", "500"))
+# Entry inserts: "sync" writes each POST /recycling/item in its own transaction, "behind"
+# queues them and a background thread writes batches of ENTRY_FLUSH_BATCH rows or every
+# ENTRY_FLUSH_INTERVAL_S seconds. Reads in the same worker flush first; other workers
+# see buffered entries at most ENTRY_FLUSH_INTERVAL_S late.
+app.config["ENTRY_WRITE_MODE"] = os.getenv("ENTRY_WRITE_MODE", "sync").lower()
+app.config["ENTRY_FLUSH_BATCH"] = int(os.getenv("ENTRY_FLUSH_BATCH", "200"))
+app.config["ENTRY_FLUSH_INTERVAL_S"] = float(os.getenv("ENTRY_FLUSH_INTERVAL_S", "0.5"))
+# Request/SQL instrumentation served on /metrics (Prometheus text format). Counters are per
+# worker process. METRICS_SLOW_QUERIES is how many statements /metrics lists by max time;
+# SLOW_REQUEST_MS > 0 logs a warning for every request slower than that.
+app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "no", "")
+app.config["METRICS_SLOW_QUERIES"] = int(os.getenv("METRICS_SLOW_QUERIES", "20"))
+app.config["SLOW_REQUEST_MS"] = float(os.getenv("SLOW_REQUEST_MS", "0"))
+# Live dashboard events on /api/events (Server-Sent Events). Each open stream holds a
+# server thread, so size SSE_MAX_SUBSCRIBERS to the worker's thread budget; pushes to one
+# client are coalesced to at most one every SSE_COALESCE_S seconds. The hub is per worker
+# process: a dashboard only hears about writes handled by the worker it is connected to.
+app.config["SSE_COALESCE_S"] = float(os.getenv("SSE_COALESCE_S", "1.0"))
+app.config["SSE_KEEPALIVE_S"] = float(os.getenv("SSE_KEEPALIVE_S", "15"))
+app.config["SSE_MAX_SUBSCRIBERS"] = int(os.getenv("SSE_MAX_SUBSCRIBERS", "100"))
+# Conditional GET: browsers may reuse catalog responses (/api/item, /api/autocomplete) for
+# CATALOG_MAX_AGE_S seconds before revalidating; RESPONSE_CACHE_SIZE rendered catalog
+# bodies are kept in memory, keyed by their ETag.
+app.config["CATALOG_MAX_AGE_S"] = int(os.getenv("CATALOG_MAX_AGE_S", "60"))
+app.config["RESPONSE_CACHE_SIZE"] = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
 
 # OAuth setup (Google)
 oauth = OAuth(app)
@@ -126,23 +218,272 @@ ITEMS = {
     },
 }
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "recycling.db")
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
 
 
 # ---------------- DB helpers ----------------
+class PooledConnection:
+    """Thin proxy around a pooled sqlite3 connection; close() hands it back to the pool."""
+
+    __slots__ = ("_pool", "_conn")
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    # Timed up to the first result row; that covers the search and any sort, not the fetch.
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return self._conn.execute(sql, params)
+        finally:
+            record_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, rows):
+        start = time.perf_counter()
+        try:
+            return self._conn.executemany(sql, rows)
+        finally:
+            record_sql(sql, time.perf_counter() - start)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+
+class ConnectionPool:
+    """Per-process pool of SQLite connections with the PRAGMAs applied once per connection."""
+
+    def __init__(self, path, size=8, journal_mode="WAL", synchronous="NORMAL",
+                 busy_timeout_ms=5000, cache_size_kb=8192):
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"DB_JOURNAL_MODE must be one of {', '.join(JOURNAL_MODES)}")
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"DB_SYNCHRONOUS must be one of {', '.join(SYNCHRONOUS_LEVELS)}")
+        self.path = path
+        self.size = max(0, int(size))
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout_ms = int(busy_timeout_ms)
+        self.cache_size_kb = int(cache_size_kb)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._journal_set = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        if not self._journal_set:
+            # journal_mode=WAL is persistent in the database file, so one connection is enough.
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            self._journal_set = True
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _check_fork(self):
+        # Connections must not cross a fork (gunicorn preload etc.), start over in the child.
+        if os.getpid() != self._pid:
+            self._idle = []
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    def acquire(self):
+        self._check_fork()
+        conn = None
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+        if conn is None:
+            conn = self._connect()
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        if os.getpid() != self._pid:
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    app.config["DB_PATH"],
+                    size=app.config["DB_POOL_SIZE"],
+                    journal_mode=app.config["DB_JOURNAL_MODE"],
+                    synchronous=app.config["DB_SYNCHRONOUS"],
+                    busy_timeout_ms=app.config["DB_BUSY_TIMEOUT_MS"],
+                    cache_size_kb=app.config["DB_CACHE_SIZE_KB"],
+                )
+    return _pool
+
+
+def close_pool():
+    if _pool is not None:
+        _pool.close_all()
+
+
+# registered before entry_writer.close, so it runs after the last write-behind flush
+atexit.register(close_pool)
+
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_pool().acquire()
+    if _fts_ready is None:
+        sync_fts(conn)
     return conn
 
 
+def fts5_trigram_available():
+    """FTS5 with the trigram tokenizer needs SQLite 3.34+ compiled with FTS5."""
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE probe USING fts5(x, tokenize='trigram')")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+# Substring search goes through FTS5 trigram indexes when both this SQLite build and the
+# database have them, LIKE otherwise. Trigram indexes cannot answer queries shorter than
+# three characters, those use LIKE too.
+FTS_MIN_CHARS = 3
+FTS_TABLES = ("listings_fts", "items_fts")
+FTS_TRIGGERS = tuple(f"trg_{t}_fts_{op}" for t in ("listings", "items") for op in ("insert", "delete", "update"))
+_fts_ready = None  # None until sync_fts() has looked at the schema
+_fts_lock = threading.Lock()
+
+
+def fts_schema(conn):
+    names = ("listings", "items") + FTS_TABLES + FTS_TRIGGERS
+    return {r[0] for r in conn.execute(
+        f"SELECT name FROM sqlite_master WHERE name IN ({', '.join('?' * len(names))})", names)}
+
+
+def sync_fts(conn):
+    """Decide once per process whether text search uses FTS, fixing up the schema for this SQLite build.
+
+    The FTS migration is recorded once per database, but the DB may later be opened by a
+    SQLite with or without trigram FTS5. Without it the sync triggers are dropped, or every
+    write to listings/items would fail; with it missing tables or triggers are (re)created
+    and the indexes rebuilt, so rows written in the meantime are searchable again.
+    """
+    global _fts_ready
+    with _fts_lock:
+        if _fts_ready is not None:
+            return
+        names = fts_schema(conn)
+        if not {"listings", "items"} <= names:
+            return  # not migrated yet, migrate() resets the decision
+        complete = names >= set(FTS_TABLES + FTS_TRIGGERS)
+        if not fts5_trigram_available():
+            triggers = names & set(FTS_TRIGGERS)
+            if triggers:
+                app.logger.warning("SQLite has no FTS5 trigram tokenizer, dropping the full-text sync triggers")
+                for name in sorted(triggers):
+                    conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+                conn.commit()
+            _fts_ready = False
+            return
+        if not complete:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # another worker may have finished the rebuild while we waited for the lock
+                if not fts_schema(conn) >= set(FTS_TABLES + FTS_TRIGGERS):
+                    app.logger.warning("full-text indexes are missing or out of sync, rebuilding them")
+                    install_fts(conn)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        _fts_ready = True
+
+
+def fts_ready():
+    if _fts_ready is None:
+        get_db_connection().close()
+    return bool(_fts_ready)
+
+
+def fts_phrase(q):
+    """Quote user text as one FTS5 phrase so operators and punctuation are matched literally."""
+    return '"' + q.replace('"', '""') + '"'
+
+
 def now_ts():
     return datetime.utcnow().isoformat()
 
 
-def init_db():
-    conn = get_db_connection()
+# ---------------- Schema migrations ----------------
+# MIGRATIONS run once per database, in order, inside one BEGIN IMMEDIATE transaction, and
+# PRAGMA user_version records the last one applied; a current database costs one PRAGMA
+# read at startup. Steps 1-8 also upgrade databases created before versioning existed,
+# which may already have some of their tables, so they keep the IF NOT EXISTS / column
+# probes. New steps can assume everything before them has run. Never edit a released step,
+# append a new one.
+def sql_statements(script):
+    """Split a DDL script into single statements; trigger bodies keep their inner semicolons."""
+    statements, buf = [], ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            statements.append(buf.strip())
+            buf = ""
+    if buf.strip():
+        statements.append(buf.strip())
+    return statements
+
+
+def run_script(conn, script):
+    # executescript() would COMMIT first and break the migration transaction
+    for statement in sql_statements(script):
+        conn.execute(statement)
+
 
+def table_columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def migrate_base_tables(conn):
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS entries (
@@ -154,25 +495,18 @@ def init_db():
         )
         """
     )
-    conn.commit()
-
-    cur = conn.execute("PRAGMA table_info(entries)")
-    cols = [r[1] for r in cur.fetchall()]
-    if "material" not in cols:
-        conn.execute("ALTER TABLE entries ADD COLUMN material TEXT DEFAULT ''")
-    if "points" not in cols:
-        conn.execute("ALTER TABLE entries ADD COLUMN points REAL DEFAULT 0")
-    if "bin" not in cols:
-        conn.execute("ALTER TABLE entries ADD COLUMN bin TEXT DEFAULT ''")
-    if "prep" not in cols:
-        conn.execute("ALTER TABLE entries ADD COLUMN prep TEXT DEFAULT ''")
-    if "notes" not in cols:
-        conn.execute("ALTER TABLE entries ADD COLUMN notes TEXT DEFAULT ''")
-    if "link" not in cols:
-        conn.execute("ALTER TABLE entries ADD COLUMN link TEXT DEFAULT ''")
-    if "user_id" not in cols:
-        conn.execute("ALTER TABLE entries ADD COLUMN user_id TEXT")
-    conn.commit()
+    cols = table_columns(conn, "entries")
+    for name, ddl in (
+        ("material", "material TEXT DEFAULT ''"),
+        ("points", "points REAL DEFAULT 0"),
+        ("bin", "bin TEXT DEFAULT ''"),
+        ("prep", "prep TEXT DEFAULT ''"),
+        ("notes", "notes TEXT DEFAULT ''"),
+        ("link", "link TEXT DEFAULT ''"),
+        ("user_id", "user_id TEXT"),
+    ):
+        if name not in cols:
+            conn.execute(f"ALTER TABLE entries ADD COLUMN {ddl}")
 
     conn.execute(
         """
@@ -187,8 +521,6 @@ def init_db():
         )
         """
     )
-    conn.commit()
-
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS users (
@@ -202,11 +534,7 @@ def init_db():
         )
         """
     )
-
-    # Add email column to users if it doesn't exist yet
-    cur = conn.execute("PRAGMA table_info(users)")
-    user_cols = [r[1] for r in cur.fetchall()]
-    if "email" not in user_cols:
+    if "email" not in table_columns(conn, "users"):
         conn.execute("ALTER TABLE users ADD COLUMN email TEXT")
 
     conn.execute(
@@ -265,14 +593,381 @@ def init_db():
         )
         """
     )
-    conn.commit()
-    conn.close()
 
 
-def seed_items_if_empty():
+def migrate_listings_geohash(conn):
+    if "geohash" not in table_columns(conn, "listings"):
+        conn.execute("ALTER TABLE listings ADD COLUMN geohash TEXT DEFAULT NULL")
+        rows = conn.execute("SELECT id, lat, lon FROM listings WHERE lat IS NOT NULL AND lon IS NOT NULL").fetchall()
+        conn.executemany(
+            "UPDATE listings SET geohash=? WHERE id=?",
+            [(geohash_encode(r["lat"], r["lon"]), r["id"]) for r in rows],
+        )
+
+
+def migrate_hot_path_indexes(conn):
+    # Indexes for the hot read paths, see hot_queries() / `flask check-query-plans`.
+    run_script(
+        conn,
+        """
+        CREATE INDEX IF NOT EXISTS idx_entries_user_points ON entries(user_id, points);
+        CREATE INDEX IF NOT EXISTS idx_items_lower_name ON items(lower(name));
+        CREATE INDEX IF NOT EXISTS idx_auth_users_lower_email ON auth_users(lower(email));
+        DROP INDEX IF EXISTS idx_listings_feed;
+        CREATE INDEX IF NOT EXISTS idx_listings_feed_owner ON listings(listing_type, active, created_ts, owner_user_id);
+        CREATE INDEX IF NOT EXISTS idx_listings_active_created ON listings(active, created_ts);
+        CREATE INDEX IF NOT EXISTS idx_listings_owner ON listings(owner_user_id);
+        CREATE INDEX IF NOT EXISTS idx_listings_geo ON listings(listing_type, active, geohash);
+        CREATE INDEX IF NOT EXISTS idx_matches_b ON matches(listing_b_id);
+        """
+    )
+
+
+def migrate_user_points(conn):
+    # Running point totals per user, kept in step with entries by triggers.
+    run_script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS user_points (
+          user_id TEXT PRIMARY KEY,
+          total_points REAL NOT NULL DEFAULT 0,
+          entry_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_user_points_total ON user_points(total_points);
+
+        CREATE TRIGGER IF NOT EXISTS trg_entries_points_insert AFTER INSERT ON entries
+        WHEN NEW.user_id IS NOT NULL
+        BEGIN
+          INSERT INTO user_points (user_id, total_points, entry_count)
+          VALUES (NEW.user_id, COALESCE(NEW.points, 0), 1)
+          ON CONFLICT(user_id) DO UPDATE SET
+            total_points = total_points + excluded.total_points,
+            entry_count = entry_count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_entries_points_delete AFTER DELETE ON entries
+        WHEN OLD.user_id IS NOT NULL
+        BEGIN
+          UPDATE user_points
+          SET total_points = total_points - COALESCE(OLD.points, 0), entry_count = entry_count - 1
+          WHERE user_id = OLD.user_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_entries_points_update AFTER UPDATE OF points, user_id ON entries
+        BEGIN
+          UPDATE user_points
+          SET total_points = total_points - COALESCE(OLD.points, 0), entry_count = entry_count - 1
+          WHERE user_id = OLD.user_id;
+          INSERT INTO user_points (user_id, total_points, entry_count)
+          SELECT NEW.user_id, COALESCE(NEW.points, 0), 1 WHERE NEW.user_id IS NOT NULL
+          ON CONFLICT(user_id) DO UPDATE SET
+            total_points = total_points + excluded.total_points,
+            entry_count = entry_count + 1;
+        END;
+        """
+    )
+
+
+def migrate_user_breakdown(conn):
+    # Entry counts and points per user and bin / material, same idea as user_points.
+    run_script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS user_breakdown (
+          user_id TEXT NOT NULL,
+          kind TEXT NOT NULL,
+          key TEXT NOT NULL,
+          entry_count INTEGER NOT NULL DEFAULT 0,
+          points REAL NOT NULL DEFAULT 0,
+          PRIMARY KEY (user_id, kind, key)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trg_entries_breakdown_insert AFTER INSERT ON entries
+        WHEN NEW.user_id IS NOT NULL
+        BEGIN
+          INSERT INTO user_breakdown (user_id, kind, key, entry_count, points)
+          VALUES (NEW.user_id, 'bin', COALESCE(NEW.bin, ''), 1, COALESCE(NEW.points, 0)),
+                 (NEW.user_id, 'material', COALESCE(NEW.material, ''), 1, COALESCE(NEW.points, 0))
+          ON CONFLICT(user_id, kind, key) DO UPDATE SET
+            entry_count = entry_count + 1,
+            points = points + excluded.points;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_entries_breakdown_delete AFTER DELETE ON entries
+        WHEN OLD.user_id IS NOT NULL
+        BEGIN
+          UPDATE user_breakdown
+          SET entry_count = entry_count - 1, points = points - COALESCE(OLD.points, 0)
+          WHERE user_id = OLD.user_id
+            AND ((kind = 'bin' AND key = COALESCE(OLD.bin, ''))
+              OR (kind = 'material' AND key = COALESCE(OLD.material, '')));
+          DELETE FROM user_breakdown WHERE user_id = OLD.user_id AND entry_count <= 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_entries_breakdown_update AFTER UPDATE OF points, user_id, bin, material ON entries
+        BEGIN
+          UPDATE user_breakdown
+          SET entry_count = entry_count - 1, points = points - COALESCE(OLD.points, 0)
+          WHERE user_id = OLD.user_id
+            AND ((kind = 'bin' AND key = COALESCE(OLD.bin, ''))
+              OR (kind = 'material' AND key = COALESCE(OLD.material, '')));
+          DELETE FROM user_breakdown WHERE user_id = OLD.user_id AND entry_count <= 0;
+          INSERT INTO user_breakdown (user_id, kind, key, entry_count, points)
+          SELECT NEW.user_id, 'bin', COALESCE(NEW.bin, ''), 1, COALESCE(NEW.points, 0) WHERE NEW.user_id IS NOT NULL
+          UNION ALL
+          SELECT NEW.user_id, 'material', COALESCE(NEW.material, ''), 1, COALESCE(NEW.points, 0) WHERE NEW.user_id IS NOT NULL
+          ON CONFLICT(user_id, kind, key) DO UPDATE SET
+            entry_count = entry_count + 1,
+            points = points + excluded.points;
+        END;
+        """
+    )
+    # both aggregate tables exist from here on; fill them from whatever entries already hold
+    rebuild_user_aggregates(conn)
+
+
+def migrate_data_versions(conn):
+    # Change counters for in-memory caches and ETags; bumped by triggers so every process can see them.
+    run_script(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+          name TEXT PRIMARY KEY,
+          version INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO data_versions (name, version) VALUES ('items', 0), ('entries', 0), ('users', 0);
+
+        CREATE TRIGGER IF NOT EXISTS trg_items_version_insert AFTER INSERT ON items
+        BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'items'; END;
+        CREATE TRIGGER IF NOT EXISTS trg_items_version_update AFTER UPDATE ON items
+        BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'items'; END;
+        CREATE TRIGGER IF NOT EXISTS trg_items_version_delete AFTER DELETE ON items
+        BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'items'; END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_entries_version_insert AFTER INSERT ON entries
+        BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'entries'; END;
+        CREATE TRIGGER IF NOT EXISTS trg_entries_version_update AFTER UPDATE ON entries
+        BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'entries'; END;
+        CREATE TRIGGER IF NOT EXISTS trg_entries_version_delete AFTER DELETE ON entries
+        BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'entries'; END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_users_version_insert AFTER INSERT ON users
+        BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'users'; END;
+        CREATE TRIGGER IF NOT EXISTS trg_users_version_update AFTER UPDATE ON users
+        BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'users'; END;
+        CREATE TRIGGER IF NOT EXISTS trg_users_version_delete AFTER DELETE ON users
+        BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'users'; END;
+        """
+    )
+
+
+def migrate_fts(conn):
+    if not fts5_trigram_available():
+        app.logger.warning("SQLite has no FTS5 trigram tokenizer, text search stays on LIKE")
+        return
+    install_fts(conn)
+
+
+def install_fts(conn):
+    """External-content FTS5 indexes over listings and items, kept in sync by triggers."""
+    run_script(
+        conn,
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+          query_text, category, content='listings', content_rowid='id', tokenize='trigram'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_listings_fts_insert AFTER INSERT ON listings
+        BEGIN
+          INSERT INTO listings_fts (rowid, query_text, category) VALUES (NEW.id, NEW.query_text, NEW.category);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_listings_fts_delete AFTER DELETE ON listings
+        BEGIN
+          INSERT INTO listings_fts (listings_fts, rowid, query_text, category)
+          VALUES ('delete', OLD.id, OLD.query_text, OLD.category);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_listings_fts_update AFTER UPDATE OF query_text, category ON listings
+        BEGIN
+          INSERT INTO listings_fts (listings_fts, rowid, query_text, category)
+          VALUES ('delete', OLD.id, OLD.query_text, OLD.category);
+          INSERT INTO listings_fts (rowid, query_text, category) VALUES (NEW.id, NEW.query_text, NEW.category);
+        END;
+
+        CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+          name, notes, content='items', content_rowid='id', tokenize='trigram'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_items_fts_insert AFTER INSERT ON items
+        BEGIN
+          INSERT INTO items_fts (rowid, name, notes) VALUES (NEW.id, NEW.name, NEW.notes);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_items_fts_delete AFTER DELETE ON items
+        BEGIN
+          INSERT INTO items_fts (items_fts, rowid, name, notes) VALUES ('delete', OLD.id, OLD.name, OLD.notes);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_items_fts_update AFTER UPDATE OF name, notes ON items
+        BEGIN
+          INSERT INTO items_fts (items_fts, rowid, name, notes) VALUES ('delete', OLD.id, OLD.name, OLD.notes);
+          INSERT INTO items_fts (rowid, name, notes) VALUES (NEW.id, NEW.name, NEW.notes);
+        END;
+        """
+    )
+    # index rows written before the tables (or while the triggers were missing)
+    conn.execute("INSERT INTO listings_fts (listings_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+
+
+def data_version(conn, name):
+    row = conn.execute("SELECT version FROM data_versions WHERE name=?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def data_versions(conn, names):
+    """Versions of several tables in the order given, in one query."""
+    rows = dict(conn.execute(
+        f"SELECT name, version FROM data_versions WHERE name IN ({', '.join('?' * len(names))})", names).fetchall())
+    return [rows.get(name, 0) for name in names]
+
+
+def rebuild_user_aggregates(conn):
+    """Recompute user_points and user_breakdown from entries; the caller commits."""
+    conn.execute("DELETE FROM user_points")
+    conn.execute(
+        """
+        INSERT INTO user_points (user_id, total_points, entry_count)
+        SELECT user_id, COALESCE(SUM(points), 0), COUNT(1) FROM entries
+        WHERE user_id IS NOT NULL GROUP BY user_id
+        """
+    )
+    conn.execute("DELETE FROM user_breakdown")
+    for kind in ("bin", "material"):
+        conn.execute(
+            f"""
+            INSERT INTO user_breakdown (user_id, kind, key, entry_count, points)
+            SELECT user_id, '{kind}', COALESCE({kind}, ''), COUNT(1), COALESCE(SUM(points), 0) FROM entries
+            WHERE user_id IS NOT NULL GROUP BY user_id, COALESCE({kind}, '')
+            """
+        )
+
+
+# Daily and weekly entry totals per user and for everyone (user_id ''), keyed on bin and material.
+ROLLUP_TABLES = {
+    # table -> SQL expression giving the bucket of an entry row (`{r}` is NEW or OLD)
+    "rollup_daily": "{r}.date",
+    # ISO weeks, bucketed on their Monday
+    "rollup_weekly": "date({r}.date, 'weekday 0', '-6 days')",
+}
+
+
+def rollup_triggers_sql():
+    def add(table, bucket):
+        return f"""
+          INSERT INTO {table} (user_id, bucket, bin, material, entry_count, amount, points)
+          SELECT u.id, {bucket.format(r="NEW")}, COALESCE(NEW.bin, ''), COALESCE(NEW.material, ''),
+                 1, COALESCE(NEW.amount, 0), COALESCE(NEW.points, 0)
+          FROM (SELECT '' AS id UNION ALL SELECT NEW.user_id WHERE NEW.user_id IS NOT NULL) u
+          WHERE NEW.date IS NOT NULL
+          ON CONFLICT(user_id, bucket, bin, material) DO UPDATE SET
+            entry_count = entry_count + 1,
+            amount = amount + excluded.amount,
+            points = points + excluded.points;"""
+
+    def remove(table, bucket):
+        match = (f"user_id IN ('', COALESCE(OLD.user_id, '')) AND bucket = {bucket.format(r='OLD')} "
+                 f"AND bin = COALESCE(OLD.bin, '') AND material = COALESCE(OLD.material, '')")
+        return f"""
+          UPDATE {table} SET entry_count = entry_count - 1,
+            amount = amount - COALESCE(OLD.amount, 0), points = points - COALESCE(OLD.points, 0)
+          WHERE {match};
+          DELETE FROM {table} WHERE {match} AND entry_count <= 0;"""
+
+    inserts = "".join(add(t, b) for t, b in ROLLUP_TABLES.items())
+    deletes = "".join(remove(t, b) for t, b in ROLLUP_TABLES.items())
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS trg_entries_rollup_insert AFTER INSERT ON entries
+        BEGIN{inserts}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_entries_rollup_delete AFTER DELETE ON entries
+        BEGIN{deletes}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_entries_rollup_update
+        AFTER UPDATE OF date, bin, material, amount, points, user_id ON entries
+        BEGIN{deletes}{inserts}
+        END;
+    """
+
+
+def rebuild_entry_rollups(conn):
+    """Recompute the rollup tables from entries; the caller commits."""
+    for table, bucket in ROLLUP_TABLES.items():
+        conn.execute(f"DELETE FROM {table}")
+        for user_expr in ("''", "user_id"):
+            conn.execute(
+                f"""
+                INSERT INTO {table} (user_id, bucket, bin, material, entry_count, amount, points)
+                SELECT {user_expr}, {bucket.format(r="entries")}, COALESCE(bin, ''), COALESCE(material, ''),
+                       COUNT(1), COALESCE(SUM(amount), 0), COALESCE(SUM(points), 0)
+                FROM entries
+                WHERE date IS NOT NULL{" AND user_id IS NOT NULL" if user_expr == "user_id" else ""}
+                GROUP BY 1, 2, 3, 4
+                """
+            )
+
+
+def truncate_entries(conn):
+    """Delete every entry and empty the aggregates kept from them, in one transaction.
+
+    The AFTER DELETE triggers on entries would update user_points, user_breakdown, the
+    rollups and data_versions once per row, only for the aggregates to be wiped anyway;
+    they are dropped around the delete so SQLite can truncate the table instead. DDL is
+    transactional, so other connections never see entries without its triggers.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        triggers = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND tbl_name='entries' "
+            "AND name LIKE 'trg\\_entries\\_%\\_delete' ESCAPE '\\'"
+        ).fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.execute("DELETE FROM entries")
+        for name, sql in triggers:
+            conn.execute(sql)
+        conn.execute("DELETE FROM user_points")
+        conn.execute("DELETE FROM user_breakdown")
+        for table in ROLLUP_TABLES:
+            conn.execute(f"DELETE FROM {table}")
+        # once, instead of once per deleted row
+        conn.execute("UPDATE data_versions SET version = version + 1 WHERE name = 'entries'")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Recompute the daily/weekly rollups (and per-user totals) from entries."""
+    flush_entries()
     conn = get_db_connection()
-    cur = conn.execute("SELECT COUNT(1) as c FROM items")
-    if cur.fetchone()[0] == 0:
+    try:
+        rebuild_entry_rollups(conn)
+        rebuild_user_aggregates(conn)
+        conn.commit()
+        counts = {t: conn.execute(f"SELECT COUNT(1) FROM {t}").fetchone()[0] for t in ROLLUP_TABLES}
+    finally:
+        conn.close()
+    print(", ".join(f"{t}: {n} rows" for t, n in counts.items()))
+
+
+def migrate_seed_items(conn):
+    if not conn.execute("SELECT 1 FROM items LIMIT 1").fetchone():
         seed = [
             ("Plastic bottle", "Plastic", "Recycle", "Empty and rinse", "#1 PET bottles usually accepted", "https://search.earth911.com/"),
             ("Aluminum can", "Metal", "Recycle", "Empty and rinse", "Aluminum is highly recyclable", "https://search.earth911.com/"),
@@ -287,8 +982,638 @@ def seed_items_if_empty():
             "INSERT OR IGNORE INTO items (name,material,bin,prep,notes,link) VALUES (?, ?, ?, ?, ?, ?)",
             seed,
         )
+
+
+def migrate_entry_rollups(conn):
+    for table in ROLLUP_TABLES:
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+              user_id TEXT NOT NULL,
+              bucket TEXT NOT NULL,
+              bin TEXT NOT NULL,
+              material TEXT NOT NULL,
+              entry_count INTEGER NOT NULL DEFAULT 0,
+              amount REAL NOT NULL DEFAULT 0,
+              points REAL NOT NULL DEFAULT 0,
+              PRIMARY KEY (user_id, bucket, bin, material)
+            ) WITHOUT ROWID
+            """
+        )
+    run_script(conn, rollup_triggers_sql())
+    rebuild_entry_rollups(conn)
+
+
+def migrate_zip_centroids(conn):
+    backfill_zip_centroids(conn)
+
+
+MIGRATIONS = [
+    (1, "base tables", migrate_base_tables),
+    (2, "listings.geohash", migrate_listings_geohash),
+    (3, "hot path indexes", migrate_hot_path_indexes),
+    (4, "user_points aggregate", migrate_user_points),
+    (5, "user_breakdown aggregate", migrate_user_breakdown),
+    (6, "data_versions counters", migrate_data_versions),
+    (7, "full-text indexes", migrate_fts),
+    (8, "seed items catalog", migrate_seed_items),
+    (9, "daily / weekly entry rollups", migrate_entry_rollups),
+    (10, "zip centroid coordinates", migrate_zip_centroids),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=SCHEMA_VERSION):
+    """Apply pending migrations up to `target`; returns the versions applied."""
+    global _fts_ready
+    if schema_version(conn) >= target:
+        return []
+    # IMMEDIATE takes the write lock up front, so workers starting together queue here
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = schema_version(conn)
+        applied = []
+        for version, _, step in MIGRATIONS:
+            if current < version <= target:
+                step(conn)
+                applied.append(version)
+        if applied:
+            conn.execute(f"PRAGMA user_version = {applied[-1]}")
         conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    # the FTS tables may have just been created
+    _fts_ready = None
+    return applied
+
+
+def init_db():
+    """Returns True when the schema is current; that case costs one PRAGMA read."""
+    # straight from the pool: the FTS check in get_db_connection() waits for the first request
+    conn = get_pool().acquire()
+    try:
+        version = schema_version(conn)
+        if version < SCHEMA_VERSION and app.config["DB_AUTO_MIGRATE"]:
+            migrate(conn)
+            version = schema_version(conn)
+    finally:
+        conn.close()
+    if version < SCHEMA_VERSION:
+        app.logger.warning("database schema is at version %d, expected %d: run `flask migrate`",
+                           version, SCHEMA_VERSION)
+        return False
+    return True
+
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Bring the database schema up to date (run before starting workers)."""
+    conn = get_db_connection()
+    try:
+        applied = migrate(conn)
+        version = schema_version(conn)
+    finally:
+        conn.close()
+    for v, description, _ in MIGRATIONS:
+        if v in applied:
+            print(f"applied {v}: {description}")
+    print(f"schema version {version}")
+
+
+# ---------------- Metrics ----------------
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+METRICS_MAX_QUERIES = 1000
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+def prom_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", " ").replace('"', '\\"')
+
+
+class RequestMetrics:
+    """Per-process request and SQL statistics, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}       # (route, method, status) -> count
+        self.latency = {}        # (route, method) -> Histogram of seconds
+        self.sql_count = {}      # route -> Histogram of statements per request
+        self.sql_seconds = {}    # route -> Histogram of SQL seconds per request
+        self.queries = {}        # sql text -> [calls, total seconds, max seconds]
+
+    def observe_request(self, route, method, status, seconds, sql_count, sql_seconds):
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.latency.get((route, method))
+            if hist is None:
+                hist = self.latency[(route, method)] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+            if route not in self.sql_count:
+                self.sql_count[route] = Histogram(SQL_COUNT_BUCKETS)
+                self.sql_seconds[route] = Histogram(LATENCY_BUCKETS)
+            self.sql_count[route].observe(sql_count)
+            self.sql_seconds[route].observe(sql_seconds)
+
+    def observe_query(self, sql, seconds):
+        with self._lock:
+            stats = self.queries.get(sql)
+            if stats is None:
+                if len(self.queries) >= METRICS_MAX_QUERIES:
+                    return
+                stats = self.queries[sql] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+    def slowest_queries(self, n):
+        merged = {}
+        with self._lock:
+            for sql, (calls, total, worst) in self.queries.items():
+                text = " ".join(sql.split())
+                m = merged.setdefault(text, [0, 0.0, 0.0])
+                m[0] += calls
+                m[1] += total
+                m[2] = max(m[2], worst)
+        return sorted(merged.items(), key=lambda kv: kv[1][2], reverse=True)[:n]
+
+    def render(self, caches):
+        out = []
+        with self._lock:
+            out.append("# HELP recycling_requests_total Requests served, by route, method and status.")
+            out.append("# TYPE recycling_requests_total counter")
+            for (route, method, status), n in sorted(self.requests.items()):
+                out.append(f'recycling_requests_total{{route="{prom_label(route)}",method="{method}",status="{status}"}} {n}')
+            out.append("# HELP recycling_request_duration_seconds Request latency by route.")
+            out.append("# TYPE recycling_request_duration_seconds histogram")
+            for (route, method), hist in sorted(self.latency.items()):
+                out.extend(hist.lines("recycling_request_duration_seconds", f'route="{prom_label(route)}",method="{method}"'))
+            out.append("# HELP recycling_request_sql_statements SQL statements executed per request.")
+            out.append("# TYPE recycling_request_sql_statements histogram")
+            for route, hist in sorted(self.sql_count.items()):
+                out.extend(hist.lines("recycling_request_sql_statements", f'route="{prom_label(route)}"'))
+            out.append("# HELP recycling_request_sql_seconds Time spent in SQL per request.")
+            out.append("# TYPE recycling_request_sql_seconds histogram")
+            for route, hist in sorted(self.sql_seconds.items()):
+                out.extend(hist.lines("recycling_request_sql_seconds", f'route="{prom_label(route)}"'))
+
+        slowest = self.slowest_queries(app.config["METRICS_SLOW_QUERIES"])
+        for name, idx, kind, help_text in (
+            ("recycling_sql_query_max_seconds", 2, "gauge", "Slowest single execution of the statement."),
+            ("recycling_sql_query_seconds_total", 1, "counter", "Total time spent in the statement."),
+            ("recycling_sql_query_calls_total", 0, "counter", "Executions of the statement."),
+        ):
+            out.append(f"# HELP {name} {help_text} Only the METRICS_SLOW_QUERIES slowest statements are listed.")
+            out.append(f"# TYPE {name} {kind}")
+            for text, stats in slowest:
+                value = stats[idx] if idx == 0 else f"{stats[idx]:.6f}"
+                out.append(f'{name}{{query="{prom_label(text)}"}} {value}')
+
+        for name, kind, field in (
+            ("recycling_cache_hits_total", "counter", "hits"),
+            ("recycling_cache_misses_total", "counter", "misses"),
+            ("recycling_cache_entries", "gauge", "size"),
+        ):
+            out.append(f"# TYPE {name} {kind}")
+            for cache, stats in caches.items():
+                out.append(f'{name}{{cache="{cache}"}} {stats[field]}')
+        return "\n".join(out) + "\n"
+
+
+metrics = RequestMetrics()
+
+
+def record_sql(sql, seconds):
+    if not app.config["METRICS_ENABLED"]:
+        return
+    if has_request_context():
+        g.sql_count = g.get("sql_count", 0) + 1
+        g.sql_seconds = g.get("sql_seconds", 0.0) + seconds
+    metrics.observe_query(sql, seconds)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get("request_start")
+    if start is None or not app.config["METRICS_ENABLED"]:
+        return response
+    elapsed = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    sql_count = g.get("sql_count", 0)
+    sql_seconds = g.get("sql_seconds", 0.0)
+    metrics.observe_request(route, request.method, response.status_code, elapsed, sql_count, sql_seconds)
+    slow_ms = app.config["SLOW_REQUEST_MS"]
+    if slow_ms > 0 and elapsed * 1000 >= slow_ms:
+        app.logger.warning(
+            "slow request: %s %s -> %s in %.1f ms (%d SQL statements, %.1f ms in SQL)",
+            request.method, request.full_path.rstrip("?"), response.status_code,
+            elapsed * 1000, sql_count, sql_seconds * 1000,
+        )
+    return response
+
+
+# ---------------- Entry writes ----------------
+SQL_ENTRY_INSERT = """
+    INSERT INTO entries (item, amount, date, ts, material, points, bin, prep, notes, link, user_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class EntryWriter:
+    """Write-behind buffer for entry rows, flushed in batches by a background thread."""
+
+    def __init__(self, batch_size=200, interval=0.5):
+        self.batch_size = max(1, int(batch_size))
+        self.interval = interval
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def add(self, row):
+        with self._cond:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_thread()
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows written."""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            conn = get_db_connection()
+            try:
+                with conn:
+                    conn.executemany(SQL_ENTRY_INSERT, rows)
+            except sqlite3.Error:
+                with self._cond:
+                    self._pending[:0] = rows
+                raise
+            finally:
+                conn.close()
+            publish_points(rows)
+            return len(rows)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=max(5.0, self.interval * 4))
+        self.flush()
+
+    def _ensure_thread(self):
+        # threads do not survive a fork, start one per worker process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="entry-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except sqlite3.Error:
+                app.logger.exception("entry write-behind flush failed, will retry")
+            if closed:
+                return
+
+
+entry_writer = EntryWriter(app.config["ENTRY_FLUSH_BATCH"], app.config["ENTRY_FLUSH_INTERVAL_S"])
+atexit.register(entry_writer.close)
+
+
+def record_entry(row):
+    if app.config["ENTRY_WRITE_MODE"] == "behind":
+        entry_writer.add(row)
+        return
+    conn = get_db_connection()
+    conn.execute(SQL_ENTRY_INSERT, row)
+    conn.commit()
     conn.close()
+    publish_points([row])
+
+
+def flush_entries():
+    """Make buffered entries visible before reading entries or their aggregates."""
+    if app.config["ENTRY_WRITE_MODE"] == "behind":
+        entry_writer.flush()
+
+
+# ---------------- Live events ----------------
+class EventSubscriber:
+    """One open event stream; pending events are keyed so newer values replace older ones."""
+
+    def __init__(self, user_id, coalesce_s):
+        self.user_id = user_id
+        self.coalesce_s = coalesce_s
+        self.pending = {}
+        self.cond = threading.Condition()
+        self.last_push = 0.0
+
+    def offer(self, key, event, data, keep=()):
+        with self.cond:
+            prev = self.pending.get(key)
+            if prev is not None:
+                data = dict(data, **{k: prev[1][k] for k in keep if k in prev[1]})
+            self.pending[key] = (event, data)
+            self.cond.notify()
+
+    def next_batch(self, timeout):
+        """Blocks until something is pending (None on timeout), then at most one batch per coalesce interval."""
+        with self.cond:
+            if not self.pending:
+                self.cond.wait(timeout)
+            if not self.pending:
+                return None
+        delay = self.last_push + self.coalesce_s - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        with self.cond:
+            batch, self.pending = list(self.pending.values()), {}
+        self.last_push = time.monotonic()
+        return batch
+
+
+class EventHub:
+    """In-process publish/subscribe for dashboard streams."""
+
+    def __init__(self):
+        self._subs = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, coalesce_s, limit):
+        sub = EventSubscriber(user_id, coalesce_s)
+        with self._lock:
+            if len(self._subs) >= limit:
+                return None
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def __len__(self):
+        return len(self._subs)
+
+    def publish(self, event, key, data, user_id=None, keep=()):
+        """Send to every stream, or only to `user_id`'s streams; `keep` fields survive coalescing."""
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            if user_id is None or sub.user_id == user_id:
+                sub.offer((event, key), event, data, keep)
+
+
+event_hub = EventHub()
+
+
+def publish_points(rows):
+    """Push XP and leaderboard deltas for the users in freshly written entry rows."""
+    if not len(event_hub):
+        return
+    added = {}
+    for row in rows:
+        user_id = row[10]
+        if user_id is not None:
+            added[user_id] = added.get(user_id, 0) + (row[5] or 0)
+    if not added:
+        return
+    conn = get_db_connection()
+    try:
+        for user_id, points in added.items():
+            r = conn.execute(SQL_USER_POINTS, (user_id,)).fetchone()
+            total = r["total_points"] if r else 0
+            u = conn.execute("SELECT COALESCE(display_name, 'Guest') AS name FROM users WHERE id=?", (user_id,)).fetchone()
+            rank = conn.execute(SQL_POINTS_RANK, (total,)).fetchone()[0] + 1
+            event_hub.publish("xp", user_id, {"total_points": total, "level": calculate_level(total)}, user_id=user_id)
+            # old_total lets clients move other rows; it is kept from the first of a coalesced burst
+            event_hub.publish(
+                "leaderboard", user_id,
+                {"id": user_id, "name": u["name"] if u else "Guest", "total_points": total,
+                 "old_total": total - points, "rank": rank},
+                keep=("old_total",),
+            )
+    finally:
+        conn.close()
+
+
+# ---------------- Session store ----------------
+SESSION_BACKENDS = ("filesystem", "sqlite", "memory")
+
+
+class ExpiringSessionInterface(ServerSideSessionInterface):
+    """Flask-Session interface base with dirty-only writes and periodic expiry sweeps.
+
+    Subclasses store (data, expires) per store id; expires is a unix timestamp.
+    """
+
+    session_class = ServerSideSession
+    ttl = False
+
+    def __init__(self, app, sweep_interval=300.0):
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self._loaded = threading.local()
+        super().__init__(
+            app,
+            key_prefix=app.config.get("SESSION_KEY_PREFIX", "session:"),
+            permanent=app.config["SESSION_PERMANENT"],
+            serialization_format=app.config.get("SESSION_SERIALIZATION_FORMAT", "msgpack"),
+        )
+
+    def open_session(self, app, request):
+        self._loaded.expires = None
+        sess = super().open_session(app, request)
+        sess.store_expires = self._loaded.expires
+        return sess
+
+    def should_set_storage(self, app, session):
+        if session.modified:
+            return True
+        # unchanged sessions are only rewritten to push their expiry out again
+        expires = getattr(session, "store_expires", None)
+        if expires is None:
+            return False
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        return expires - time.time() < lifetime / 2
+
+    def _retrieve_session_data(self, store_id):
+        found = self._load(store_id)
+        if found is None:
+            return None
+        data, expires = found
+        if expires <= time.time():
+            return None
+        self._loaded.expires = expires
+        return self.serializer.decode(data)
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        now = time.time()
+        self._store(store_id, self.serializer.encode(session), now + session_lifetime.total_seconds())
+        if now >= self._next_sweep and self._sweep_lock.acquire(blocking=False):
+            try:
+                self._next_sweep = now + self.sweep_interval
+                self._delete_expired_sessions()
+            finally:
+                self._sweep_lock.release()
+
+    @abstractmethod
+    def _load(self, store_id):
+        """(data, expires) for the store id, or None."""
+
+    @abstractmethod
+    def _store(self, store_id, data, expires):
+        """Insert or replace the row for the store id."""
+
+
+class SqliteSessionInterface(ExpiringSessionInterface):
+    """Sessions in a SQLite table, one row per session id."""
+
+    def __init__(self, app, path, sweep_interval=300.0):
+        self.pool = ConnectionPool(
+            path,
+            size=app.config["DB_POOL_SIZE"],
+            journal_mode="WAL",
+            synchronous="NORMAL",
+            busy_timeout_ms=app.config["DB_BUSY_TIMEOUT_MS"],
+            cache_size_kb=2048,
+        )
+        conn = self.pool.acquire()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                expires REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires)")
+        conn.commit()
+        conn.close()
+        super().__init__(app, sweep_interval)
+
+    def _load(self, store_id):
+        conn = self.pool.acquire()
+        row = conn.execute("SELECT data, expires FROM sessions WHERE id=?", (store_id,)).fetchone()
+        conn.close()
+        return (row["data"], row["expires"]) if row else None
+
+    def _store(self, store_id, data, expires):
+        conn = self.pool.acquire()
+        conn.execute(
+            "INSERT INTO sessions (id, data, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data=excluded.data, expires=excluded.expires",
+            (store_id, data, expires),
+        )
+        conn.commit()
+        conn.close()
+
+    def _delete_session(self, store_id):
+        conn = self.pool.acquire()
+        conn.execute("DELETE FROM sessions WHERE id=?", (store_id,))
+        conn.commit()
+        conn.close()
+
+    def _delete_expired_sessions(self):
+        conn = self.pool.acquire()
+        conn.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+        conn.commit()
+        conn.close()
+
+
+class MemorySessionInterface(ExpiringSessionInterface):
+    """Sessions in a per-process dict; lost on restart and not shared between workers."""
+
+    def __init__(self, app, sweep_interval=300.0):
+        self._data = {}
+        self._lock = threading.Lock()
+        super().__init__(app, sweep_interval)
+
+    def _load(self, store_id):
+        return self._data.get(store_id)
+
+    def _store(self, store_id, data, expires):
+        # keep the encoded bytes so requests never share mutable session objects
+        self._data[store_id] = (data, expires)
+
+    def _delete_session(self, store_id):
+        self._data.pop(store_id, None)
+
+    def _delete_expired_sessions(self):
+        now = time.time()
+        with self._lock:
+            expired = [k for k, (_, expires) in list(self._data.items()) if expires <= now]
+            for k in expired:
+                self._data.pop(k, None)
+
+
+def init_session_store():
+    backend = app.config["SESSION_BACKEND"]
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"SESSION_BACKEND must be one of {', '.join(SESSION_BACKENDS)}")
+    if backend == "sqlite":
+        app.session_interface = SqliteSessionInterface(
+            app, app.config["SESSION_DB_PATH"], app.config["SESSION_SWEEP_INTERVAL_S"])
+    elif backend == "memory":
+        app.session_interface = MemorySessionInterface(app, app.config["SESSION_SWEEP_INTERVAL_S"])
+    else:
+        Session(app)
+
+
+init_session_store()
 
 
 # ---------------- Session helpers ----------------
@@ -305,27 +1630,46 @@ def ensure_session():
         session["history"] = []
 
 
+# user ids this process knows have a users row; cleared wholesale when it grows past the cap
+KNOWN_USERS_MAX = 100_000
+_known_users = set()
+
+
+def remember_user(user_id):
+    if len(_known_users) >= KNOWN_USERS_MAX:
+        _known_users.clear()
+    _known_users.add(user_id)
+
+
 def ensure_user():
     if "user_id" not in session:
         session["user_id"] = str(uuid.uuid4())
 
     user_id = session["user_id"]
+    if user_id in _known_users:
+        return user_id
 
+    # read first, so users created by another worker never cost a write transaction
     conn = get_db_connection()
-    conn.execute(
-        "INSERT OR IGNORE INTO users (id, created_ts) VALUES (?, ?)",
-        (user_id, now_ts()),
-    )
-    conn.commit()
+    if not conn.execute("SELECT 1 FROM users WHERE id=?", (user_id,)).fetchone():
+        conn.execute(
+            "INSERT OR IGNORE INTO users (id, created_ts) VALUES (?, ?)",
+            (user_id, now_ts()),
+        )
+        conn.commit()
     conn.close()
+    remember_user(user_id)
 
     return user_id
 
 
+EARTH_RADIUS_KM = 6371.0
+
+
 def haversine_km(lat1, lon1, lat2, lon2):
     if None in (lat1, lon1, lat2, lon2):
         return None
-    R = 6371.0
+    R = EARTH_RADIUS_KM
     p = math.pi / 180.0
     dlat = (lat2 - lat1) * p
     dlon = (lon2 - lon1) * p
@@ -333,6 +1677,249 @@ def haversine_km(lat1, lon1, lat2, lon2):
     return 2 * R * math.asin(math.sqrt(a))
 
 
+# Below this many points NumPy's array conversion costs more than the loop it replaces
+# (bench/bench_haversine.py), so short batches stay on the pure-Python path.
+HAVERSINE_NUMPY_MIN = 48
+
+
+def haversine_many(lat, lon, lats, lons, max_km=None):
+    """Distances (km) from (lat, lon) to every (lats[i], lons[i]), and a mask of those within max_km.
+
+    A point with a missing coordinate gets distance None (NaN from NumPy) and mask False;
+    max_km=None masks in every located point. Returns NumPy arrays when NumPy is installed
+    and the batch has at least HAVERSINE_NUMPY_MIN points, lists otherwise.
+    """
+    n = len(lats)
+    if lat is None or lon is None:
+        return [None] * n, [False] * n
+    p = math.pi / 180.0
+    if np is not None and n >= HAVERSINE_NUMPY_MIN:
+        lat2 = np.array(lats, dtype=float) * p
+        lon2 = np.array(lons, dtype=float) * p
+        a = np.sin((lat2 - lat * p) / 2) ** 2 + math.cos(lat * p) * np.cos(lat2) * np.sin((lon2 - lon * p) / 2) ** 2
+        dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+        with np.errstate(invalid="ignore"):
+            mask = ~np.isnan(dist) if max_km is None else dist <= max_km
+        return dist, mask
+
+    lat1 = lat * p
+    lon1 = lon * p
+    cos_lat1 = math.cos(lat1)
+    sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+    dist = []
+    mask = []
+    for la, lo in zip(lats, lons):
+        if la is None or lo is None:
+            dist.append(None)
+            mask.append(False)
+            continue
+        la *= p
+        a = sin((la - lat1) / 2) ** 2 + cos_lat1 * cos(la) * sin((lo * p - lon1) / 2) ** 2
+        d = 2 * EARTH_RADIUS_KM * asin(sqrt(a))
+        dist.append(d)
+        mask.append(max_km is None or d <= max_km)
+    return dist, mask
+
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~5 m cells; stored on listings, queried by prefix
+# same sphere as haversine_km(), or the prefilter box would clip circles it should contain
+KM_PER_DEG_LAT = EARTH_RADIUS_KM * math.pi / 180
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    out = []
+    bits = 0
+    ch = 0
+    even = True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(GEOHASH_BASE32[ch])
+            bits = 0
+            ch = 0
+    return "".join(out)
+
+
+def geohash_cell_size(precision):
+    """(height, width) of a geohash cell in degrees."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_cover(lat, lon, radius_km):
+    """Geohash prefixes whose cells together cover the circle, or None when it spans too much of the globe.
+
+    Uses the longest precision whose cells are at least radius_km on each side,
+    so the centre cell and its eight neighbours always contain the circle.
+    """
+    max_lat = min(abs(lat) + radius_km / KM_PER_DEG_LAT, 89.9)
+    km_per_deg_lon = KM_PER_DEG_LAT * math.cos(math.radians(max_lat))
+    precision = 0
+    for p in range(1, GEOHASH_PRECISION + 1):
+        h, w = geohash_cell_size(p)
+        if h * KM_PER_DEG_LAT < radius_km or w * km_per_deg_lon < radius_km:
+            break
+        precision = p
+    if precision == 0:
+        return None
+
+    h, w = geohash_cell_size(precision)
+    cells = set()
+    for dlat in (-h, 0.0, h):
+        for dlon in (-w, 0.0, w):
+            cell_lat = min(max(lat + dlat, -90.0), 89.999999)
+            cell_lon = (lon + dlon + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def parse_coord(value):
+    try:
+        return float(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------- ZIP centroids ----------------
+ZIP_RE = re.compile(r"^(\d{5})(?:-?\d{4})?$")
+
+
+class ZipCentroids:
+    """ZIP -> (lat, lon) table in sorted parallel arrays, about 12 bytes per ZIP."""
+
+    def __init__(self, rows=()):
+        rows = sorted(rows)
+        self.zips = array("I", (z for z, _, _ in rows))
+        self.lats = array("f", (lat for _, lat, _ in rows))
+        self.lons = array("f", (lon for _, _, lon in rows))
+
+    @classmethod
+    def load(cls, path):
+        opener = gzip.open if path.endswith(".gz") else open
+        rows = []
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#") or line.startswith("zip,"):
+                    continue
+                zip_code, lat, lon = line.rstrip("\n").split(",")
+                rows.append((int(zip_code), float(lat), float(lon)))
+        return cls(rows)
+
+    def __len__(self):
+        return len(self.zips)
+
+    def lookup(self, zip_code):
+        """(lat, lon) of a 5-digit or ZIP+4 code, or None when unknown."""
+        m = ZIP_RE.match((zip_code or "").strip())
+        if not m:
+            return None
+        key = int(m.group(1))
+        i = bisect.bisect_left(self.zips, key)
+        if i == len(self.zips) or self.zips[i] != key:
+            return None
+        return round(self.lats[i], 4), round(self.lons[i], 4)
+
+
+_zip_centroids = None
+_zip_centroids_lock = threading.Lock()
+
+
+def get_zip_centroids():
+    """The ZipCentroids table, read from ZIP_CENTROIDS_PATH on first use."""
+    global _zip_centroids
+    if _zip_centroids is None:
+        with _zip_centroids_lock:
+            if _zip_centroids is None:
+                path = app.config["ZIP_CENTROIDS_PATH"]
+                _zip_centroids = ZipCentroids.load(path) if path else ZipCentroids()
+    return _zip_centroids
+
+
+def resolve_location(zip_code, lat, lon):
+    """Explicit coordinates when both are given, else the ZIP centroid, else (None, None)."""
+    if lat is not None and lon is not None:
+        return lat, lon
+    return get_zip_centroids().lookup(zip_code) or (None, None)
+
+
+def backfill_zip_centroids(conn):
+    """Place users and listings that have a known ZIP but no coordinates; returns rows updated per table."""
+    centroids = get_zip_centroids()
+    counts = {}
+    for table in ("users", "listings"):
+        zips = [r[0] for r in conn.execute(f"SELECT DISTINCT zip FROM {table} WHERE lat IS NULL AND zip != ''")]
+        updates = []
+        for zip_code in zips:
+            found = centroids.lookup(zip_code)
+            if found:
+                updates.append((found[0], found[1], geohash_encode(*found), zip_code))
+        before = conn.total_changes
+        if table == "users":
+            conn.executemany("UPDATE users SET lat=?, lon=? WHERE zip=? AND lat IS NULL",
+                             [(lat, lon, z) for lat, lon, _, z in updates])
+        else:
+            conn.executemany("UPDATE listings SET lat=?, lon=?, geohash=? WHERE zip=? AND lat IS NULL", updates)
+        counts[table] = conn.total_changes - before
+    return counts
+
+
+@app.cli.command("backfill-zips")
+def backfill_zips_command():
+    """Fill lat/lon of zip-only users and listings from ZIP_CENTROIDS_PATH."""
+    conn = get_db_connection()
+    try:
+        counts = backfill_zip_centroids(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print(", ".join(f"{t}: {n} rows" for t, n in counts.items()))
+
+
+# Same curve as calculateLevel() in templates/index.html
+def calculate_level(total_xp):
+    level = 1
+    xp_needed = 100
+    remaining = total_xp
+    while remaining >= xp_needed:
+        remaining -= xp_needed
+        level += 1
+        xp_needed = 100 + (level - 1) * 150
+    return {"level": level, "current_xp": remaining, "xp_needed": xp_needed, "title": level_title(level)}
+
+
+def level_title(level):
+    if level <= 5:
+        return "Recycler Rookie"
+    if level <= 10:
+        return "Eco Warrior"
+    if level <= 20:
+        return "Planet Protector"
+    if level <= 35:
+        return "Sustainability Champion"
+    return "Environmental Legend"
+
+
 # ---------------- Lookup logic ----------------
 def normalize(s: str) -> str:
     s = (s or "").strip().lower()
@@ -340,36 +1927,116 @@ def normalize(s: str) -> str:
     return s
 
 
-def heuristic_classify(q: str):
-    qn = normalize(q)
-    hazardous = ["battery", "lithium", "paint", "chemical", "motor oil", "oil", "propane", "aerosol", "bleach"]
-    ewaste = ["laptop", "computer", "phone", "tablet", "tv", "monitor", "electronics", "printer", "router"]
-    compost = ["banana", "apple", "food", "peel", "coffee", "tea", "egg", "compost", "leftover"]
-    recycle = ["bottle", "can", "cardboard", "paper", "glass", "aluminum", "tin", "steel"]
-
-    def contains_any(words):
-        return any(w in qn for w in words)
-
-    if contains_any(hazardous):
-        return {"bin": "Special Drop-off", "prep": ["Keep sealed", "Do NOT place in curbside bin"],
-                "notes": "Hazardous items can cause fires/contamination. Use a drop-off site.",
-                "link": "https://search.earth911.com/", "material": "Hazardous", "name": q}
-    if contains_any(ewaste):
-        return {"bin": "Special Drop-off", "prep": ["Bring to e-waste recycler", "Remove personal data when possible"],
+# Checked in this order: the first category with a keyword anywhere in the query wins.
+CLASSIFY_RULES = [
+    ("hazardous", {"bin": "Special Drop-off", "prep": ["Keep sealed", "Do NOT place in curbside bin"],
+                   "notes": "Hazardous items can cause fires/contamination. Use a drop-off site.",
+                   "link": "https://search.earth911.com/", "material": "Hazardous"}),
+    ("ewaste", {"bin": "Special Drop-off", "prep": ["Bring to e-waste recycler", "Remove personal data when possible"],
                 "notes": "E-waste contains hazardous materials and valuable metals.",
-                "link": "https://search.earth911.com/", "material": "Electronics", "name": q}
-    if contains_any(compost):
-        return {"bin": "Compost", "prep": ["Compost if available (home/municipal)"],
-                "notes": "Food scraps are typically compostable (rules vary).",
-                "link": "https://search.earth911.com/", "material": "Organic", "name": q}
-    if contains_any(recycle):
-        return {"bin": "Recycle", "prep": ["Empty and rinse", "Keep clean and dry"],
-                "notes": "Common recyclables vary by city; check local rules.",
-                "link": "https://search.earth911.com/", "material": "Mixed", "name": q}
-    return {"bin": "Depends",
-            "prep": ["Check local rules", "If contaminated/unknown, landfill is safer than contaminating recycling"],
-            "notes": "Not sure. Many items require special programs.",
-            "link": "https://search.earth911.com/", "material": "Unknown", "name": q}
+                "link": "https://search.earth911.com/", "material": "Electronics"}),
+    ("compost", {"bin": "Compost", "prep": ["Compost if available (home/municipal)"],
+                 "notes": "Food scraps are typically compostable (rules vary).",
+                 "link": "https://search.earth911.com/", "material": "Organic"}),
+    ("recycle", {"bin": "Recycle", "prep": ["Empty and rinse", "Keep clean and dry"],
+                 "notes": "Common recyclables vary by city; check local rules.",
+                 "link": "https://search.earth911.com/", "material": "Mixed"}),
+]
+CLASSIFY_UNKNOWN = {"bin": "Depends",
+                    "prep": ["Check local rules", "If contaminated/unknown, landfill is safer than contaminating recycling"],
+                    "notes": "Not sure. Many items require special programs.",
+                    "link": "https://search.earth911.com/", "material": "Unknown"}
+CLASSIFY_KEYWORDS = {
+    "hazardous": ["battery", "lithium", "paint", "chemical", "motor oil", "oil", "propane", "aerosol", "bleach"],
+    "ewaste": ["laptop", "computer", "phone", "tablet", "tv", "monitor", "electronics", "printer", "router"],
+    "compost": ["banana", "apple", "food", "peel", "coffee", "tea", "egg", "compost", "leftover"],
+    "recycle": ["bottle", "can", "cardboard", "paper", "glass", "aluminum", "tin", "steel"],
+}
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over (keyword, priority) pairs.
+
+    best() scans the text once and returns the lowest priority of any keyword
+    occurring in it, so the cost depends on the text length, not the vocabulary.
+    """
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]
+        for word, prio in keywords:
+            if not word:
+                continue
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                    self._goto[node][ch] = nxt
+                node = nxt
+            if self._best[node] is None or prio < self._best[node]:
+                self._best[node] = prio
+
+        # breadth-first so a node's failure target is finished before its children
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                inherited = self._best[self._fail[nxt]]
+                if inherited is not None and (self._best[nxt] is None or inherited < self._best[nxt]):
+                    self._best[nxt] = inherited
+
+    def best(self, text):
+        goto, fail, best = self._goto, self._fail, self._best
+        node = 0
+        found = None
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            prio = best[node]
+            if prio is not None and (found is None or prio < found):
+                found = prio
+                if prio == 0:
+                    break
+        return found
+
+
+def load_classify_keywords(path=""):
+    keywords = {name: list(words) for name, words in CLASSIFY_KEYWORDS.items()}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            extra = json.load(f)
+        for name, words in extra.items():
+            if name not in keywords:
+                raise ValueError(f"unknown classify category {name!r} in {path}")
+            keywords[name].extend(normalize(w) for w in words)
+    return keywords
+
+
+def build_classify_matcher(keywords):
+    return KeywordMatcher(
+        (word, prio) for prio, (name, _) in enumerate(CLASSIFY_RULES) for word in keywords.get(name, ())
+    )
+
+
+classify_matcher = build_classify_matcher(load_classify_keywords(app.config["CLASSIFY_KEYWORDS_PATH"]))
+
+
+def heuristic_classify(q: str):
+    prio = classify_matcher.best(normalize(q))
+    result = CLASSIFY_UNKNOWN if prio is None else CLASSIFY_RULES[prio][1]
+    return dict(result, prep=list(result["prep"]), name=q)
 
 
 def lookup_item_info(query: str):
@@ -384,29 +2051,866 @@ def lookup_item_info(query: str):
         info["material"] = info.get("material", "Unknown")
         return info
 
+    check_items_version()
+    cached = lookup_cache.get(qn)
+    if cached is None:
+        cached = _lookup_item_uncached(qn)
+        lookup_cache.set(qn, cached)
+
+    info, named_after_query = cached
+    info = dict(info, prep=list(info["prep"]))
+    if named_after_query:
+        info["name"] = q
+    return info
+
+
+def _lookup_item_uncached(qn):
+    """Returns (info, named_after_query) for a normalized query."""
     conn = get_db_connection()
-    row = conn.execute(
-        "SELECT name, material, bin, prep, notes, link FROM items WHERE lower(name)=lower(?) LIMIT 1", (q,)
-    ).fetchone()
+    row = conn.execute(SQL_ITEM_EXACT, (qn,)).fetchone()
     if not row:
-        row = conn.execute(
-            "SELECT name, material, bin, prep, notes, link FROM items WHERE lower(name) LIKE lower(?) ORDER BY name LIMIT 1",
-            (f"%{q}%",)
-        ).fetchone()
+        row = next(iter(search_items(conn, qn, limit=1, name_only=True)), None)
     conn.close()
 
     if row:
         return {"name": row["name"], "bin": row["bin"] or "Recycle",
                 "prep": [row["prep"]] if row["prep"] else [],
                 "notes": row["notes"] or "", "link": row["link"] or "https://search.earth911.com/",
-                "material": row["material"] or "Unknown"}
+                "material": row["material"] or "Unknown"}, False
+
+    return heuristic_classify(qn), True
+
+
+# ---------------- Item search index ----------------
+class ItemSearchIndex:
+    """N-gram index over item names; answers prefix and substring queries without SQLite."""
+
+    NGRAM = 3
+
+    def __init__(self, items):
+        self.items = []
+        self.names = []
+        seen = set()
+        for it in items:
+            norm = normalize(it.get("name"))
+            if not norm or norm in seen:
+                continue
+            seen.add(norm)
+            self.items.append({"name": it["name"], "material": it.get("material") or "", "bin": it.get("bin") or ""})
+            self.names.append(norm)
+
+        # every substring of length 1..NGRAM -> ids of the names containing it
+        self.grams = {}
+        for i, name in enumerate(self.names):
+            for n in range(1, self.NGRAM + 1):
+                for p in range(len(name) - n + 1):
+                    self.grams.setdefault(name[p:p + n], set()).add(i)
+
+    def _candidates(self, qn):
+        if len(qn) <= self.NGRAM:
+            return self.grams.get(qn, ())
+        postings = []
+        for p in range(len(qn) - self.NGRAM + 1):
+            ids = self.grams.get(qn[p:p + self.NGRAM])
+            if not ids:
+                return ()
+            postings.append(ids)
+        postings.sort(key=len)
+        ids = set(postings[0]).intersection(*postings[1:])
+        return [i for i in ids if qn in self.names[i]]
+
+    def _rank(self, i, qn):
+        name = self.names[i]
+        pos = name.find(qn)
+        if name == qn:
+            kind = 0
+        elif pos == 0:
+            kind = 1
+        elif not name[pos - 1].isalnum():
+            kind = 2  # starts a word
+        else:
+            kind = 3
+        return (kind, pos, len(name), name)
+
+    def search(self, q, limit=20):
+        """Exact, then prefix, then word-prefix, then substring matches."""
+        qn = normalize(q)
+        if not qn:
+            return []
+        ids = heapq.nsmallest(limit, self._candidates(qn), key=lambda i: self._rank(i, qn))
+        return [self.items[i] for i in ids]
+
+
+class LRUCache:
+    """Size-bounded LRU mapping with an optional TTL and hit/miss counters."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def values(self):
+        """Snapshot of the live values, without touching recency or counters."""
+        now = time.monotonic()
+        with self._lock:
+            return [v for v, expires in self._data.values() if expires is None or expires > now]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+_item_index = None
+_item_index_lock = threading.Lock()
+_items_version = None
+_items_checked = 0.0
+lookup_cache = LRUCache(app.config["LOOKUP_CACHE_SIZE"], app.config["LOOKUP_CACHE_TTL_S"])
+
+
+def check_items_version():
+    """Drops the catalog caches if items changed in any process; reads SQLite at most every ITEM_INDEX_RECHECK_S."""
+    global _items_version, _items_checked
+    if time.monotonic() - _items_checked < app.config["ITEM_INDEX_RECHECK_S"]:
+        return
+    conn = get_db_connection()
+    try:
+        version = data_version(conn, "items")
+    finally:
+        conn.close()
+    _items_checked = time.monotonic()
+    if version != _items_version:
+        _items_version = version
+        invalidate_item_caches()
+
+
+def get_item_index():
+    """The current ItemSearchIndex, rebuilt after the items catalog changed."""
+    global _item_index
+    check_items_version()
+    idx = _item_index
+    if idx is not None:
+        return idx
+
+    with _item_index_lock:
+        if _item_index is None:
+            conn = get_db_connection()
+            try:
+                rows = conn.execute("SELECT name, material, bin FROM items ORDER BY name").fetchall()
+            finally:
+                conn.close()
+            static = [{"name": k, "material": v.get("material", ""), "bin": v.get("bin", "")} for k, v in ITEMS.items()]
+            _item_index = ItemSearchIndex([dict(r) for r in rows] + static)
+        return _item_index
+
+
+def invalidate_item_caches():
+    """Call after writing to items so this process does not wait for the next recheck."""
+    global _item_index
+    _item_index = None
+    lookup_cache.clear()
+
+
+# ---------------- Hot queries ----------------
+SQL_ITEM_EXACT = "SELECT name, material, bin, prep, notes, link FROM items WHERE lower(name)=lower(?) LIMIT 1"
+SQL_ITEM_LIKE = (
+    "SELECT name, material, bin, prep, notes, link FROM items WHERE lower(name) LIKE lower(?) ORDER BY name LIMIT ?"
+)
+SQL_ITEM_LIKE_NOTES = (
+    "SELECT name, material, bin, prep, notes, link FROM items "
+    "WHERE lower(name) LIKE lower(?) OR lower(notes) LIKE lower(?) ORDER BY name LIMIT ?"
+)
+# name matches weigh ten times a notes match; shorter names win ties ("battery" over "car battery")
+SQL_ITEM_SEARCH = """
+    SELECT i.name, i.material, i.bin, i.prep, i.notes, i.link
+    FROM items_fts f JOIN items i ON i.id = f.rowid
+    WHERE items_fts MATCH ?
+    ORDER BY bm25(items_fts, 10.0, 1.0), length(i.name), i.name
+    LIMIT ?
+"""
+# keyset page: rows after `id`, LIMIT -1 means no limit
+SQL_ENTRIES = (
+    "SELECT id, item, amount, date, ts, material, points, bin, prep, notes, link FROM entries "
+    "WHERE id > ? ORDER BY id ASC LIMIT ?"
+)
+SQL_RECIPROCAL = """
+    SELECT s.listing_id FROM swipes s
+    JOIN listings l ON l.id = s.listing_id
+    WHERE s.swiper_user_id = (SELECT owner_user_id FROM listings WHERE id = ?)
+    AND l.owner_user_id = ?
+    AND s.decision = 'yes'
+"""
+SQL_SWIPE_UPSERT = """
+    INSERT INTO swipes (swiper_user_id, listing_id, decision, created_ts)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(swiper_user_id, listing_id) DO UPDATE SET
+      decision=excluded.decision, created_ts=excluded.created_ts
+"""
+# Every (liked listing, my listing) pair where the liked listing's owner said yes to mine.
+# The liked ids come in as one JSON array so the batch size is not bound by SQLite's variable limit.
+SQL_RECIPROCAL_BATCH = """
+    SELECT t.id as listing_id, s.listing_id as other_listing
+    FROM json_each(?) j
+    JOIN listings t ON t.id = j.value
+    JOIN swipes s ON s.swiper_user_id = t.owner_user_id AND s.decision = 'yes'
+    JOIN listings mine ON mine.id = s.listing_id
+    WHERE mine.owner_user_id = ?
+"""
+# which of a JSON array of listing ids the user has swiped
+SQL_SWIPED_AMONG = """
+    SELECT s.listing_id FROM json_each(?) j
+    JOIN swipes s ON s.swiper_user_id = ? AND s.listing_id = j.value
+"""
+# matches for a JSON array of [listing_a_id, listing_b_id] pairs
+SQL_MATCHES_BY_PAIRS = """
+    SELECT m.id, m.listing_a_id, m.listing_b_id FROM json_each(?) j
+    JOIN matches m ON m.listing_a_id = json_extract(j.value, '$[0]') AND m.listing_b_id = json_extract(j.value, '$[1]')
+"""
+# Split into one branch per side so both can use an index instead of an OR over the join.
+SQL_MATCHES_FOR_USER = """
+    SELECT m.id as match_id, m.created_ts,
+           la.id as a_id, la.query_text as a_text, la.intent as a_intent, la.listing_type as a_type, la.owner_user_id as a_owner,
+           lb.id as b_id, lb.query_text as b_text, lb.intent as b_intent, lb.listing_type as b_type, lb.owner_user_id as b_owner
+    FROM matches m
+    JOIN listings la ON la.id = m.listing_a_id
+    JOIN listings lb ON lb.id = m.listing_b_id
+    WHERE m.id IN (
+        SELECT m2.id FROM listings l JOIN matches m2 ON m2.listing_a_id = l.id WHERE l.owner_user_id = ?
+        UNION
+        SELECT m2.id FROM listings l JOIN matches m2 ON m2.listing_b_id = l.id WHERE l.owner_user_id = ?
+    )
+    ORDER BY m.created_ts DESC LIMIT 50
+"""
+SQL_LEADERBOARD = """
+    SELECT
+        u.id,
+        COALESCE(u.display_name, 'Guest') as name,
+        COALESCE(p.total_points, 0) as total_points
+    FROM users u
+    LEFT JOIN user_points p ON p.user_id = u.id
+    ORDER BY total_points DESC
+"""
+SQL_LEADERBOARD_TOP = """
+    SELECT
+        p.user_id as id,
+        COALESCE(u.display_name, 'Guest') as name,
+        p.total_points
+    FROM user_points p
+    LEFT JOIN users u ON u.id = p.user_id
+    ORDER BY p.total_points DESC
+    LIMIT ?
+"""
+SQL_USER_POINTS = "SELECT total_points FROM user_points WHERE user_id=?"
+SQL_POINTS_RANK = "SELECT COUNT(1) FROM user_points WHERE total_points > ?"
+SQL_USER_SUMMARY_POINTS = "SELECT total_points, entry_count FROM user_points WHERE user_id=?"
+SQL_USER_BREAKDOWN = "SELECT kind, key, entry_count, points FROM user_breakdown WHERE user_id=?"
+
+
+def listings_others_query(user_id, after_id=None, limit=-1):
+    """Newest first; `after_id` continues after that listing in the same order."""
+    params = [user_id]
+    where = "active=1 AND owner_user_id != ?"
+    if after_id is not None:
+        where += " AND (created_ts, id) < (SELECT created_ts, id FROM listings WHERE id = ?)"
+        params.append(after_id)
+    params.append(limit)
+    return f"SELECT * FROM listings WHERE {where} ORDER BY created_ts DESC, id DESC LIMIT ?", params
+
+
+def use_fts(q):
+    return len(q) >= FTS_MIN_CHARS and fts_ready()
+
+
+def search_items(conn, q, limit=10, name_only=False):
+    """Catalog rows containing q in their name (and notes unless name_only), best match first."""
+    if use_fts(q):
+        match = ("name : " if name_only else "") + fts_phrase(q)
+        return conn.execute(SQL_ITEM_SEARCH, (match, limit)).fetchall()
+    if name_only:
+        return conn.execute(SQL_ITEM_LIKE, (f"%{q}%", limit)).fetchall()
+    return conn.execute(SQL_ITEM_LIKE_NOTES, (f"%{q}%", f"%{q}%", limit)).fetchall()
+
+
+def match_filters(user_id, category="", q=""):
+    """WHERE terms shared by every match candidate query (not swiped, not mine, optional filters)."""
+    # anti-join probes the UNIQUE(swiper_user_id, listing_id) index once per candidate
+    # instead of materialising every listing the user has ever swiped; owner_user_id is
+    # in idx_listings_feed_owner so rows that get skipped are never read from the table
+    params = [user_id, user_id]
+    where = """
+      l.owner_user_id != ?
+      AND NOT EXISTS (SELECT 1 FROM swipes s WHERE s.swiper_user_id = ? AND s.listing_id = l.id)
+    """
+    if category:
+        where += " AND l.category = ?"
+        params.append(category)
+    if q and use_fts(q):
+        where += " AND l.id IN (SELECT rowid FROM listings_fts WHERE listings_fts MATCH ?)"
+        params.append(fts_phrase(q))
+    elif q:
+        where += " AND lower(l.query_text) LIKE ?"
+        params.append(f"%{q}%")
+    return where, params
+
+
+def match_next_query(user_id, listing_type, category="", q="", unlocated_only=False, limit=80):
+    """Newest candidates first; with a text filter the best text matches come first instead."""
+    ranked = bool(q) and use_fts(q)
+    where, params = match_filters(user_id, category, "" if ranked else q)
+    where = "l.active=1 AND l.listing_type = ? AND " + where
+    params = [listing_type] + params
+    if unlocated_only:
+        where += " AND (l.lat IS NULL OR l.lon IS NULL)"
+    if ranked:
+        # query_text matches count twice a category match
+        return (
+            f"SELECT l.* FROM listings_fts f JOIN listings l ON l.id = f.rowid "
+            f"WHERE listings_fts MATCH ? AND {where} "
+            f"ORDER BY bm25(listings_fts, 2.0, 1.0), l.created_ts DESC LIMIT ?",
+            [fts_phrase(q)] + params + [limit],
+        )
+    return f"SELECT l.* FROM listings l WHERE {where} ORDER BY l.created_ts DESC LIMIT ?", params + [limit]
+
+
+def match_nearby_query(user_id, listing_type, lat, lon, max_km, category="", q=""):
+    """Listings inside the bounding box of the circle, found through geohash cell ranges.
+
+    Returns (None, None) when the radius is too large for a useful prefilter.
+    """
+    cells = geohash_cover(lat, lon, max_km)
+    if cells is None:
+        return None, None
+
+    cell_sql = "SELECT id FROM listings WHERE listing_type = ? AND active=1 AND geohash >= ? AND geohash < ?"
+    cell_params = []
+    for cell in cells:
+        cell_params += [listing_type, cell, cell + "~"]
+
+    where, params = match_filters(user_id, category, q)
+    dlat = max_km / KM_PER_DEG_LAT
+    where += " AND l.lat BETWEEN ? AND ?"
+    params += [lat - dlat, lat + dlat]
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+    dlon = max_km / (KM_PER_DEG_LAT * cos_lat)
+    if -180.0 <= lon - dlon and lon + dlon <= 180.0:
+        where += " AND l.lon BETWEEN ? AND ?"
+        params += [lon - dlon, lon + dlon]
+
+    union = " UNION ALL ".join([cell_sql] * len(cells))
+    return f"SELECT l.* FROM listings l WHERE l.id IN ({union}) AND {where}", cell_params + params
+
+
+ROLLUP_PERIODS = {"day": "rollup_daily", "week": "rollup_weekly"}
+ROLLUP_GROUPS = ("none", "bin", "material")
+
+
+def rollup_query(period, user_id, start, end, group="none"):
+    """Bucket totals in [start, end] for one user ('' = everyone), optionally split by bin or material."""
+    table = ROLLUP_PERIODS[period]
+    key = "" if group == "none" else f", {group} AS key"
+    group_by = "bucket" if group == "none" else f"bucket, {group}"
+    sql = f"""
+        SELECT bucket{key}, SUM(entry_count) AS entry_count, SUM(amount) AS amount, SUM(points) AS points
+        FROM {table} WHERE user_id = ? AND bucket BETWEEN ? AND ?
+        GROUP BY {group_by} ORDER BY bucket
+    """
+    return sql, [user_id, start, end]
 
-    return heuristic_classify(q)
+
+def hot_queries():
+    """name -> (sql, params, tables allowed to be scanned).
+
+    Every query a request can hit more than once belongs here; `flask check-query-plans`
+    fails when one of them starts scanning a table it is not allowed to. Built on demand
+    because the text queries differ with and without FTS.
+    """
+    queries = {
+        "item_exact": (SQL_ITEM_EXACT, ["x"], ()),
+        # leading-wildcard LIKE cannot use an index, the items catalog is small
+        "item_like": (SQL_ITEM_LIKE, ["%x%", 1], ("items",)),
+        "data_version": ("SELECT version FROM data_versions WHERE name=?", ["items"], ()),
+        "me": ("SELECT id, display_name, zip, lat, lon FROM users WHERE id=?", ["u"], ()),
+        "auth_user_by_email": ("SELECT id, email FROM auth_users WHERE lower(email)=lower(?)", ["e"], ()),
+        "entries_page": (SQL_ENTRIES, [0, 100], ()),
+        "listings_others": listings_others_query("u") + ((),),
+        "listings_others_page": listings_others_query("u", after_id=1, limit=100) + ((),),
+        "match_next": match_next_query("u", "waste") + ((),),
+        "match_next_category": match_next_query("u", "waste", category="Plastic") + ((),),
+        "match_next_text": match_next_query("u", "waste", q="bottle") + (("f",),),
+        "match_next_short_text": match_next_query("u", "waste", q="tv") + ((),),
+        "match_nearby_text": match_nearby_query("u", "waste", 40.7, -74.0, 10.0, q="bottle") + (("listings_fts",),),
+        "match_next_unlocated": match_next_query("u", "waste", unlocated_only=True) + ((),),
+        "match_nearby": match_nearby_query("u", "waste", 40.7, -74.0, 10.0) + ((),),
+        "match_nearby_wide": match_nearby_query("u", "part", 51.5, -0.1, 400.0, category="Metal") + ((),),
+        "swiped_among": (SQL_SWIPED_AMONG, ["[1, 2, 3]", "u"], ("j",)),
+        "reciprocal": (SQL_RECIPROCAL, [1, "u"], ()),
+        # json_each is the request's own list of liked ids
+        "reciprocal_batch": (SQL_RECIPROCAL_BATCH, ["[1, 2, 3]", "u"], ("j",)),
+        "matches_by_pairs": (SQL_MATCHES_BY_PAIRS, ["[[1, 2]]"], ("j",)),
+        "match_by_pair": ("SELECT id FROM matches WHERE listing_a_id=? AND listing_b_id=?", [1, 2], ()),
+        "matches_for_user": (SQL_MATCHES_FOR_USER, ["u", "u"], ()),
+        # one row per user is returned, so users is read in full; entries must not be
+        "leaderboard": (SQL_LEADERBOARD, [], ("u",)),
+        # walks idx_user_points_total from the top and stops at LIMIT
+        "leaderboard_top": (SQL_LEADERBOARD_TOP, [10], ("p",)),
+        "user_points": (SQL_USER_POINTS, ["u"], ()),
+        "points_rank": (SQL_POINTS_RANK, [10.0], ()),
+        "user_summary_points": (SQL_USER_SUMMARY_POINTS, ["u"], ()),
+        "user_breakdown": (SQL_USER_BREAKDOWN, ["u"], ()),
+        "history_daily": rollup_query("day", "u", "2024-01-01", "2024-01-31") + ((),),
+        "history_weekly_material": rollup_query("week", "", "2024-01-01", "2024-12-30", "material") + ((),),
+    }
+    if fts_ready():
+        # MATCH lookups are reported as a scan of the FTS virtual table
+        queries["item_search"] = (SQL_ITEM_SEARCH, ['name : "bottle"', 1], ("f",))
+    return queries
+
+
+def explain_query_plan(conn, sql, params=()):
+    return [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+
+def check_query_plans(conn):
+    """Returns a list of (query name, plan line) for every unexpected table scan."""
+    problems = []
+    for name, (sql, params, allowed) in hot_queries().items():
+        for line in explain_query_plan(conn, sql, params):
+            m = re.match(r"SCAN (\w+)", line)
+            if m and m.group(1) not in allowed:
+                problems.append((name, line))
+    return problems
+
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Fail if a hot query falls back to a full table scan."""
+    conn = get_db_connection()
+    try:
+        problems = check_query_plans(conn)
+    finally:
+        conn.close()
+    for name, line in problems:
+        print(f"{name}: {line}")
+    if problems:
+        raise SystemExit(1)
+    print(f"{len(hot_queries())} query plans OK")
 
 
 # ---------------- Init DB ----------------
 init_db()
-seed_items_if_empty()
+
+
+# ---------------- Matching helpers ----------------
+def nearest_listings(conn, user_id, listing_type, lat, lon, max_km, category="", q="", limit=1):
+    """Located listings within max_km, closest first; None when the radius is too large to prefilter."""
+    sql, params = match_nearby_query(user_id, listing_type, lat, lon, max_km, category, q)
+    if sql is None:
+        return None
+    rows = conn.execute(sql, params).fetchall()
+    dist, mask = haversine_many(lat, lon, [r["lat"] for r in rows], [r["lon"] for r in rows], max_km)
+    found = [(float(dist[i]), r["id"], r) for i, r in enumerate(rows) if mask[i]]
+    out = []
+    for d, _, r in heapq.nsmallest(limit, found, key=lambda t: (t[0], t[1])):
+        card = dict(r)
+        card["distance_km"] = d
+        out.append(card)
+    return out
+
+
+def acceptable_cards(rows, my_lat, my_lon, my_zip, max_km, limit):
+    """Rows (in query order) within max_km, or with a compatible zip when either side has no coordinates."""
+    out = []
+    for r in rows:
+        if len(out) >= limit:
+            break
+        if my_lat is not None and my_lon is not None and r["lat"] is not None and r["lon"] is not None:
+            d = haversine_km(my_lat, my_lon, r["lat"], r["lon"])
+            if max_km is not None and d is not None and d > max_km:
+                continue
+            card = dict(r)
+            card["distance_km"] = d
+            out.append(card)
+            continue
+        if my_zip and r["zip"] and my_zip != r["zip"]:
+            continue
+        card = dict(r)
+        card["distance_km"] = None
+        out.append(card)
+    return out
+
+
+MATCH_SCORE_COMPONENTS = ("distance", "recency", "text", "intent")
+COMPLEMENTARY_INTENT = {"need": "offer", "offer": "need"}
+
+
+def parse_score_weights(spec):
+    """Parse "distance=0.4,recency=0.25,..."; components left out weigh 0."""
+    weights = dict.fromkeys(MATCH_SCORE_COMPONENTS, 0.0)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = part.partition("=")
+        if name.strip() not in weights:
+            raise ValueError(f"MATCH_SCORE_WEIGHTS: unknown component {name.strip()!r}")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+MATCH_WEIGHTS = parse_score_weights(app.config["MATCH_SCORE_WEIGHTS"])
+
+
+def trigrams(text):
+    text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def score_candidates(cards, q, my_intent, max_km, limit):
+    """The `limit` best cards by weighted score, best first, each with its score breakdown.
+
+    Every component is in [0, 1]: distance falls linearly to 0 at max_km (a card with no
+    coordinates that passed on zip gets 0.5), recency halves every MATCH_RECENCY_HALF_LIFE_DAYS,
+    text is the share of q's trigrams found in the listing text, intent is 1 for the
+    complementary intent (a need against offers). Only a heap of `limit` cards is kept.
+    """
+    now = datetime.utcnow()
+    half_life = app.config["MATCH_RECENCY_HALF_LIFE_DAYS"]
+    want_intent = COMPLEMENTARY_INTENT.get(my_intent)
+    q_grams = trigrams(q) if len(q) >= 3 else None
+
+    def scored():
+        for card in cards:
+            d = card.get("distance_km")
+            if d is None:
+                distance = 0.5
+            elif max_km:
+                distance = max(0.0, 1.0 - d / max_km)
+            else:
+                distance = 1.0 / (1.0 + d / 10.0)
+            try:
+                age_days = max(0.0, (now - datetime.fromisoformat(card["created_ts"])).total_seconds() / 86400)
+                recency = 0.5 ** (age_days / half_life) if half_life > 0 else 1.0
+            except (TypeError, ValueError):
+                recency = 0.0
+            text = 0.0
+            if q:
+                haystack = f"{card.get('query_text') or ''} {card.get('category') or ''}".lower()
+                if q_grams is None:
+                    text = 1.0 if q in haystack else 0.0
+                else:
+                    text = len(q_grams & trigrams(haystack)) / len(q_grams)
+            intent = 1.0 if card.get("intent") == want_intent else 0.0
+            parts = {"distance": distance, "recency": recency, "text": text, "intent": intent}
+            breakdown = {k: round(MATCH_WEIGHTS[k] * v, 4) for k, v in parts.items()}
+            yield sum(breakdown.values()), -card["id"], card, breakdown
+
+    out = []
+    for score, _, card, breakdown in heapq.nlargest(limit, scored(), key=lambda t: (t[0], t[1])):
+        card["score"] = round(score, 4)
+        card["score_breakdown"] = breakdown
+        out.append(card)
+    return out
+
+
+def find_match_candidates(conn, user_id, q, category, listing_type, intent, max_km, limit):
+    """Up to `limit` cards for the user, best score first, out of MATCH_SCORE_WINDOW candidates."""
+    me = conn.execute("SELECT lat, lon, zip FROM users WHERE id=?", (user_id,)).fetchone()
+    my_lat = me["lat"] if me else None
+    my_lon = me["lon"] if me else None
+    my_zip = me["zip"] if me else ""
+    window = max(limit, app.config["MATCH_SCORE_WINDOW"])
+
+    cards = None
+    if max_km is not None and my_lat is not None and my_lon is not None:
+        cards = nearest_listings(conn, user_id, listing_type, my_lat, my_lon, max_km, category, q, limit=window)
+        if cards is not None:
+            # listings without coordinates still pass on zip
+            sql, params = match_next_query(user_id, listing_type, category, q, unlocated_only=True, limit=window)
+            rows = conn.execute(sql, params).fetchall()
+            cards += acceptable_cards(rows, my_lat, my_lon, my_zip, max_km, window)
+
+    if cards is None:
+        sql, params = match_next_query(user_id, listing_type, category, q, limit=window)
+        cards = acceptable_cards(conn.execute(sql, params).fetchall(), my_lat, my_lon, my_zip, max_km, window)
+    return score_candidates(cards, q, intent, max_km, limit)
+
+
+class CandidateQueue:
+    """Cards for one user and filter set; swiped cards are dropped, refills run in the background."""
+
+    def __init__(self):
+        self.cards = []
+        self.generation = -1
+        self.filled_at = 0.0
+        self.refilling = False
+        self.swiped = set()  # swiped since the last fill started, kept out of the next fill
+        self.lock = threading.Lock()
+
+
+match_queues = LRUCache(app.config["MATCH_QUEUE_MAX_USERS"], app.config["MATCH_QUEUE_TTL_S"] * 4)
+_refill_pool = ThreadPoolExecutor(max_workers=max(1, app.config["MATCH_QUEUE_WORKERS"]),
+                                  thread_name_prefix="match-refill")
+_listings_generation = 0
+_listings_generation_lock = threading.Lock()
+
+
+def bump_listings_generation():
+    """New listings: queues keep serving what they have and refill in the background."""
+    global _listings_generation
+    with _listings_generation_lock:
+        _listings_generation += 1
+
+
+def fill_queue(user_id, filters, queue):
+    generation = _listings_generation
+    conn = get_db_connection()
+    try:
+        cards = find_match_candidates(conn, user_id, *filters, limit=app.config["MATCH_QUEUE_SIZE"])
+    finally:
+        conn.close()
+    with queue.lock:
+        queue.cards = [c for c in cards if c["id"] not in queue.swiped]
+        queue.swiped.clear()
+        queue.generation = generation
+        queue.filled_at = time.monotonic()
+        queue.refilling = False
+
+
+def _refill_in_background(user_id, filters, queue):
+    try:
+        fill_queue(user_id, filters, queue)
+    except Exception:
+        app.logger.exception("match queue refill failed for %s", user_id)
+        with queue.lock:
+            queue.refilling = False
+
+
+def swiped_among(user_id, listing_ids):
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(SQL_SWIPED_AMONG, (json.dumps(listing_ids), user_id)).fetchall()
+    finally:
+        conn.close()
+    return {r[0] for r in rows}
+
+
+QUEUE_PRUNE_ROUNDS = 4  # swiped-elsewhere lookups per request before serving what is left
+
+
+def queued_candidates(user_id, filters, n):
+    """The next n cards from the user's queue.
+
+    Builds the queue in SQLite only when it is missing or expired; otherwise one indexed
+    lookup drops cards the user swiped through another worker, whose forget_candidate()
+    never reached this process's queues.
+    """
+    user_queues = match_queues.get(user_id)
+    if user_queues is None:
+        user_queues = LRUCache(app.config["MATCH_QUEUE_MAX_FILTERS"])
+        match_queues.set(user_id, user_queues)
+    queue = user_queues.get(filters)
+
+    if queue is None or time.monotonic() - queue.filled_at > app.config["MATCH_QUEUE_TTL_S"]:
+        queue = CandidateQueue()
+        # registered before the fill so swipes arriving meanwhile land in queue.swiped
+        user_queues.set(filters, queue)
+        fill_queue(user_id, filters, queue)
+    else:
+        low_water = max(n, app.config["MATCH_QUEUE_SIZE"] // 4)
+        with queue.lock:
+            stale = queue.generation != _listings_generation or len(queue.cards) < low_water
+            schedule = stale and not queue.refilling
+            if schedule:
+                queue.refilling = True
+                queue.swiped.clear()
+        if schedule:
+            _refill_pool.submit(_refill_in_background, user_id, filters, queue)
+
+    for _ in range(QUEUE_PRUNE_ROUNDS):
+        with queue.lock:
+            cards = list(queue.cards[:n])
+        swiped = swiped_among(user_id, [c["id"] for c in cards]) if cards else set()
+        if not swiped:
+            return cards
+        # prune the queue in hand: it may already be evicted from match_queues (LRU, TTL,
+        # POST /api/me), and then forget_candidate() never reaches it
+        with queue.lock:
+            queue.cards = [c for c in queue.cards if c["id"] not in swiped]
+            queue.swiped.update(swiped)
+        for listing_id in swiped:
+            forget_candidate(user_id, listing_id)
+    with queue.lock:
+        return list(queue.cards[:n])
+
+
+def forget_candidate(user_id, listing_id):
+    """Drop a swiped listing from every queue of the user."""
+    user_queues = match_queues.get(user_id)
+    if user_queues is None:
+        return
+    for queue in user_queues.values():
+        with queue.lock:
+            queue.cards = [c for c in queue.cards if c["id"] != listing_id]
+            queue.swiped.add(listing_id)
+
+
+# ---------------- Conditional GET ----------------
+response_cache = LRUCache(app.config["RESPONSE_CACHE_SIZE"], 0)
+
+
+def conditional_get(*tables, key=None):
+    """ETag a GET route from data_versions so unchanged responses cost one small query.
+
+    `tables` are the data_versions rows the response depends on. "items" comes from the
+    throttled in-process copy check_items_version() keeps, so catalog routes answer from
+    memory and pick up catalog changes within ITEM_INDEX_RECHECK_S. `key` returns the
+    per-session part of the response (user id, session revision); such responses are
+    private and always revalidated. Without it the response is public, cacheable for
+    CATALOG_MAX_AGE_S and its body is also kept in response_cache.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if "entries" in tables:
+                flush_entries()
+            # before the versions: key() may create the caller's user row
+            session_part = key() if key is not None else None
+            parts = [request.full_path]
+            if "items" in tables:
+                check_items_version()
+                parts.append(_items_version)
+            db_tables = [t for t in tables if t != "items"]
+            if db_tables:
+                conn = get_db_connection()
+                parts += data_versions(conn, db_tables)
+                conn.close()
+            if key is not None:
+                parts.append(session_part)
+            etag = hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+            if key is None:
+                cache_control = f"public, max-age={app.config['CATALOG_MAX_AGE_S']}"
+            else:
+                cache_control = "private, no-cache"
+
+            cached = response_cache.get(etag) if key is None else None
+            if etag in request.if_none_match:
+                resp = app.response_class(status=304)
+            elif cached is not None:
+                resp = app.response_class(cached[0], mimetype=cached[1])
+            else:
+                resp = app.make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+                if key is None:
+                    response_cache.set(etag, (resp.get_data(), resp.mimetype))
+            resp.set_etag(etag)
+            resp.headers["Cache-Control"] = cache_control
+            return resp
+        return wrapper
+    return decorator
+
+
+def session_revision():
+    """Changes whenever /api/stats would return something else for this session."""
+    return getattr(session, "sid", ""), session.get("user_id", ""), session.get("rev", 0)
+
+
+def session_user():
+    """The caller's user id; creates the user first, since a 304 never reaches the view's ensure_user()."""
+    return ensure_user()
+
+
+# ---------------- Paging / streaming ----------------
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+HISTORY_MAX_BUCKETS = 400
+
+
+def page_args():
+    """Reads ?after_id=, ?limit= and ?stream= (ndjson|json) from the request.
+
+    Raises ValueError naming the parameter when after_id or limit is not an integer.
+    """
+    def int_arg(name):
+        raw = request.args.get(name, "").strip()
+        if not raw:
+            return None
+        try:
+            return int(raw)
+        except ValueError:
+            raise ValueError(f"{name} must be an integer") from None
+
+    after_id = int_arg("after_id")
+    limit = int_arg("limit")
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    stream = (request.args.get("stream") or "").strip().lower()
+    if stream not in ("ndjson", "json"):
+        stream = None
+    return after_id, limit, stream
+
+
+def next_cursor(rows, limit):
+    if limit is not None and len(rows) == limit:
+        return rows[-1]["id"]
+    return None
+
+
+def stream_rows(sql, params, key, fmt):
+    """Streams a query as NDJSON lines or as a chunked {key: [...]} array, one fetchmany() batch at a time."""
+    def generate():
+        conn = get_db_connection()
+        try:
+            cur = conn.execute(sql, params)
+            sep = ""
+            if fmt == "json":
+                yield '{"%s": [' % key
+            while True:
+                rows = cur.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                if fmt == "ndjson":
+                    yield "".join(json.dumps(dict(r)) + "\n" for r in rows)
+                else:
+                    yield sep + ",".join(json.dumps(dict(r)) for r in rows)
+                    sep = ","
+            if fmt == "json":
+                yield "]}"
+        finally:
+            conn.close()
+
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return Response(generate(), mimetype=mimetype)
 
 
 # =========================
@@ -469,6 +2973,7 @@ def recycling():
     history = session["history"]
     history.append({"item": item_raw, "bin": bin_name})
     session["history"] = history[-50:]
+    session["rev"] = session.get("rev", 0) + 1
 
     multiplier = 1.5 if (material or "").lower() in ("plastic", "electronics", "hazardous") else 1.0
     points = float(amount) * multiplier
@@ -477,16 +2982,7 @@ def recycling():
     ts = now_ts()
     user_id = ensure_user()
 
-    conn = get_db_connection()
-    conn.execute(
-        """
-        INSERT INTO entries (item, amount, date, ts, material, points, bin, prep, notes, link, user_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (item_raw, amount, date_str, ts, material, points, bin_name, prep_text, notes, link, user_id),
-    )
-    conn.commit()
-    conn.close()
+    record_entry((item_raw, amount, date_str, ts, material, points, bin_name, prep_text, notes, link, user_id))
 
     return jsonify(success=True, counts=session["counts"], history=session["history"], item_info=info)
 
@@ -495,6 +2991,7 @@ def recycling():
 # Recycling APIs
 # =========================
 @app.route("/api/stats")
+@conditional_get(key=session_revision)
 def api_stats():
     ensure_session()
     return jsonify({"counts": session["counts"], "history": session["history"], "known_items": sorted(ITEMS.keys())})
@@ -502,53 +2999,145 @@ def api_stats():
 
 @app.route("/api/entries")
 def api_entries():
+    """All entries, or one keyset page with ?after_id=&limit=, or a stream with ?stream=ndjson|json."""
+    try:
+        after_id, limit, stream = page_args()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    flush_entries()
+    params = (after_id or 0, limit if limit is not None else -1)
+    if stream:
+        return stream_rows(SQL_ENTRIES, params, "entries", stream)
+
+    conn = get_db_connection()
+    rows = conn.execute(SQL_ENTRIES, params).fetchall()
+    conn.close()
+    if limit is None:
+        return jsonify(entries=[dict(r) for r in rows])
+    return jsonify(entries=[dict(r) for r in rows], next_after_id=next_cursor(rows, limit))
+
+
+@app.route("/api/summary")
+def api_summary():
+    """Points, level and per bin / material counts for the current user."""
+    user_id = ensure_user()
+    flush_entries()
     conn = get_db_connection()
-    rows = conn.execute(
-        "SELECT id, item, amount, date, ts, material, points, bin, prep, notes, link FROM entries ORDER BY id ASC"
-    ).fetchall()
+    row = conn.execute(SQL_USER_SUMMARY_POINTS, (user_id,)).fetchone()
+    breakdown = conn.execute(SQL_USER_BREAKDOWN, (user_id,)).fetchall()
     conn.close()
-    return jsonify(entries=[dict(r) for r in rows])
+
+    total_points = row["total_points"] if row else 0
+    by_bin = {}
+    by_material = {}
+    for r in breakdown:
+        target = by_bin if r["kind"] == "bin" else by_material
+        target[r["key"] or "Unknown"] = r["entry_count"]
+    return jsonify(
+        user_id=user_id,
+        total_points=total_points,
+        entry_count=row["entry_count"] if row else 0,
+        by_bin=by_bin,
+        by_material=by_material,
+        level=calculate_level(total_points),
+    )
+
+
+@app.route("/api/history")
+@conditional_get("entries", key=session_user)
+def api_history():
+    """Per day or week totals from the rollup tables: ?period=day|week&start=&end=&scope=me|all&group=none|bin|material"""
+    period = (request.args.get("period") or "day").lower()
+    scope = (request.args.get("scope") or "me").lower()
+    group = (request.args.get("group") or "none").lower()
+    if period not in ROLLUP_PERIODS or scope not in ("me", "all") or group not in ROLLUP_GROUPS:
+        return jsonify(error="period must be day|week, scope me|all, group none|bin|material"), 400
+
+    step = timedelta(days=1 if period == "day" else 7)
+    try:
+        end = datetime.strptime(request.args["end"], "%Y-%m-%d").date() if request.args.get("end") else datetime.utcnow().date()
+        start = datetime.strptime(request.args["start"], "%Y-%m-%d").date() if request.args.get("start") else end - step * 29
+        if period == "week":
+            # weekly buckets are named after their Monday
+            start -= timedelta(days=start.weekday())
+            end -= timedelta(days=end.weekday())
+    except ValueError:
+        return jsonify(error="start and end must be YYYY-MM-DD"), 400
+    except OverflowError:
+        # the default start (or the week's Monday) would fall before 0001-01-01
+        return jsonify(error="range starts before 0001-01-01"), 400
+    if start > end:
+        return jsonify(error="start must not be after end"), 400
+    if (end - start) // step + 1 > HISTORY_MAX_BUCKETS:
+        return jsonify(error=f"at most {HISTORY_MAX_BUCKETS} buckets per request"), 400
+
+    user_id = ensure_user() if scope == "me" else ""
+    sql, params = rollup_query(period, user_id, start.isoformat(), end.isoformat(), group)
+    conn = get_db_connection()
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+
+    buckets = []
+    for r in rows:
+        if not buckets or buckets[-1]["bucket"] != r["bucket"]:
+            buckets.append({"bucket": r["bucket"], "entry_count": 0, "amount": 0.0, "points": 0.0})
+            if group != "none":
+                buckets[-1]["by"] = {}
+        b = buckets[-1]
+        b["entry_count"] += r["entry_count"]
+        b["amount"] += r["amount"]
+        b["points"] += r["points"]
+        if group != "none":
+            b["by"][r["key"] or "Unknown"] = {"entry_count": r["entry_count"], "amount": r["amount"], "points": r["points"]}
+    return jsonify(period=period, scope=scope, group=group, start=start.isoformat(), end=end.isoformat(),
+                   buckets=buckets)
 
 
 @app.route("/api/clear_entries", methods=["POST"])
 def api_clear_entries():
+    flush_entries()
     conn = get_db_connection()
-    conn.execute("DELETE FROM entries")
-    conn.commit()
-    conn.close()
+    try:
+        truncate_entries(conn)
+    finally:
+        conn.close()
+    event_hub.publish("reset", "", {})
     return jsonify(success=True)
 
 
+@app.route("/api/events")
+def api_events():
+    """Server-Sent Events: `xp` for the caller, `leaderboard` deltas and `reset` for everyone."""
+    user_id = ensure_user()
+    sub = event_hub.subscribe(user_id, app.config["SSE_COALESCE_S"], app.config["SSE_MAX_SUBSCRIBERS"])
+    if sub is None:
+        return jsonify(error="too many live connections, poll instead"), 503
+    keepalive = app.config["SSE_KEEPALIVE_S"]
+
+    def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                batch = sub.next_batch(keepalive)
+                if batch is None:
+                    # also how a closed connection is noticed
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(f"event: {event}\ndata: {json.dumps(data)}\n\n" for event, data in batch)
+        finally:
+            event_hub.unsubscribe(sub)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route("/api/autocomplete")
+@conditional_get("items")
 def api_autocomplete():
     q = (request.args.get("q") or "").strip()
     if not q:
         return jsonify(suggestions=[])
-
-    conn = get_db_connection()
-    rows = conn.execute(
-        "SELECT name, material, bin FROM items WHERE lower(name) LIKE lower(?) ORDER BY name LIMIT 15",
-        (f"%{q}%",),
-    ).fetchall()
-    conn.close()
-
-    qn = normalize(q)
-    extra = []
-    for k in ITEMS.keys():
-        if qn in normalize(k):
-            extra.append({"name": k, "material": ITEMS[k].get("material", ""), "bin": ITEMS[k].get("bin", "")})
-        if len(extra) >= 8:
-            break
-
-    suggestions = [dict(r) for r in rows] + extra
-    seen = set()
-    out = []
-    for s in suggestions:
-        name = (s.get("name") or "").lower()
-        if name and name not in seen:
-            seen.add(name)
-            out.append(s)
-    return jsonify(suggestions=out[:20])
+    return jsonify(suggestions=get_item_index().search(q, limit=20))
 
 
 @app.route("/api/lookup")
@@ -561,23 +3150,46 @@ def api_lookup():
 
 
 @app.route("/api/item")
+@conditional_get("items")
 def api_item():
     name = (request.args.get("name") or "").strip()
     if not name:
         return jsonify(item=None)
     conn = get_db_connection()
-    row = conn.execute(
-        "SELECT name, material, bin, prep, notes, link FROM items WHERE lower(name)=lower(?) LIMIT 1", (name,)
-    ).fetchone()
+    row = conn.execute(SQL_ITEM_EXACT, (name,)).fetchone()
     if not row:
-        row = conn.execute(
-            "SELECT name, material, bin, prep, notes, link FROM items WHERE lower(name) LIKE lower(?) ORDER BY name LIMIT 1",
-            (f"%{name}%",)
-        ).fetchone()
+        row = next(iter(search_items(conn, name, limit=1, name_only=True)), None)
     conn.close()
     return jsonify(item=dict(row) if row else None)
 
 
+@app.route("/api/items/search")
+def api_items_search():
+    """Catalog items whose name or notes contain q, most relevant first."""
+    q = (request.args.get("q") or "").strip()
+    try:
+        limit = min(max(int(request.args.get("limit", 10)), 1), 50)
+    except ValueError:
+        return jsonify(error="limit must be an integer"), 400
+    if not q:
+        return jsonify(items=[])
+    conn = get_db_connection()
+    rows = search_items(conn, q, limit=limit)
+    conn.close()
+    return jsonify(items=[dict(r) for r in rows])
+
+
+@app.route("/api/cache_stats")
+def api_cache_stats():
+    return jsonify(lookup=lookup_cache.stats(), item_index={"names": len(get_item_index().names)})
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    caches = {"lookup": lookup_cache.stats(), "match_queues": match_queues.stats()}
+    return Response(metrics.render(caches), mimetype="text/plain; version=0.0.4")
+
+
 # =========================
 # Auth API
 # =========================
@@ -612,8 +3224,7 @@ def api_me():
         data = request.get_json(force=True)
         display_name = (data.get("display_name") or "").strip()
         zip_code = (data.get("zip") or "").strip()
-        lat = data.get("lat", None)
-        lon = data.get("lon", None)
+        lat, lon = resolve_location(zip_code, parse_coord(data.get("lat")), parse_coord(data.get("lon")))
         conn.execute(
             """
             INSERT INTO users (id, display_name, zip, lat, lon, created_ts)
@@ -627,6 +3238,8 @@ def api_me():
             (user_id, display_name, zip_code, lat, lon, now_ts()),
         )
         conn.commit()
+        # location may have changed, queued cards were picked for the old one
+        match_queues.pop(user_id)
 
     row = conn.execute("SELECT id, display_name, zip, lat, lon FROM users WHERE id=?", (user_id,)).fetchone()
     conn.close()
@@ -645,8 +3258,8 @@ def api_create_listing():
     condition = (data.get("condition") or "").strip()
     price = data.get("price", None)
     zip_code = (data.get("zip") or "").strip()
-    lat = data.get("lat", None)
-    lon = data.get("lon", None)
+    lat, lon = resolve_location(zip_code, parse_coord(data.get("lat")), parse_coord(data.get("lon")))
+    geohash = geohash_encode(lat, lon) if lat is not None and lon is not None else None
 
     if listing_type not in ("waste", "part"):
         return jsonify(error="listing_type must be 'waste' or 'part'"), 400
@@ -658,26 +3271,36 @@ def api_create_listing():
     conn = get_db_connection()
     conn.execute(
         """
-        INSERT INTO listings (owner_user_id, listing_type, intent, category, query_text, condition, price, zip, lat, lon, created_ts)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO listings (owner_user_id, listing_type, intent, category, query_text, condition, price, zip, lat, lon,
+                              geohash, created_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
-        (user_id, listing_type, intent, category, query_text, condition, price, zip_code, lat, lon, now_ts()),
+        (user_id, listing_type, intent, category, query_text, condition, price, zip_code, lat, lon, geohash, now_ts()),
     )
     conn.commit()
     conn.close()
+    bump_listings_generation()
     return jsonify(success=True)
 
 
 @app.route("/api/listings/others")
 def api_listings_others():
+    try:
+        after_id, limit, stream = page_args()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
     user_id = ensure_user()
     conn = get_db_connection()
-    rows = conn.execute(
-        "SELECT * FROM listings WHERE active=1 AND owner_user_id != ? ORDER BY created_ts DESC",
-        (user_id,)
-    ).fetchall()
+    sql, params = listings_others_query(user_id, after_id, limit if limit is not None else -1)
+    if stream:
+        conn.close()
+        return stream_rows(sql, params, "listings", stream)
+
+    rows = conn.execute(sql, params).fetchall()
     conn.close()
-    return jsonify(listings=[dict(r) for r in rows])
+    if limit is None:
+        return jsonify(listings=[dict(r) for r in rows])
+    return jsonify(listings=[dict(r) for r in rows], next_after_id=next_cursor(rows, limit))
 
 
 @app.route("/api/match/next")
@@ -692,58 +3315,28 @@ def api_match_next():
         max_km = float(request.args.get("max_km")) if request.args.get("max_km", "").strip() else None
     except Exception:
         max_km = None
+    # nan never equals itself, so it would also miss the queue on every request
+    if max_km is not None and not math.isfinite(max_km):
+        return jsonify(error="max_km must be a finite number"), 400
 
     if listing_type not in ("waste", "part"):
         return jsonify(error="listing_type must be waste|part"), 400
     if my_intent not in ("offer", "need"):
         return jsonify(error="intent must be offer|need"), 400
 
-    conn = get_db_connection()
-    me = conn.execute("SELECT lat, lon, zip FROM users WHERE id=?", (user_id,)).fetchone()
-    my_lat = me["lat"] if me else None
-    my_lon = me["lon"] if me else None
-    my_zip = me["zip"] if me else ""
-
-    params = [user_id, listing_type, user_id]
-    where = """
-      l.active=1
-      AND l.owner_user_id != ?
-      AND l.listing_type = ?
-      AND l.id NOT IN (SELECT listing_id FROM swipes WHERE swiper_user_id = ?)
-    """
-    if category:
-        where += " AND l.category = ?"
-        params.append(category)
-    if q:
-        where += " AND lower(l.query_text) LIKE ?"
-        params.append(f"%{q}%")
-
-    rows = conn.execute(
-        f"SELECT l.* FROM listings l WHERE {where} ORDER BY l.created_ts DESC LIMIT 80",
-        params,
-    ).fetchall()
-
-    candidate = None
-    candidate_distance = None
-    for r in rows:
-        if my_lat and my_lon and r["lat"] and r["lon"]:
-            d = haversine_km(my_lat, my_lon, r["lat"], r["lon"])
-            if max_km is not None and d is not None and d > max_km:
-                continue
-            candidate = dict(r)
-            candidate_distance = d
-            break
-        else:
-            if my_zip and r["zip"] and my_zip != r["zip"]:
-                continue
-            candidate = dict(r)
-            break
+    try:
+        batch = int(request.args["batch"]) if request.args.get("batch", "").strip() else None
+    except ValueError:
+        batch = None
+    if batch is not None:
+        batch = min(max(batch, 1), app.config["MATCH_BATCH_MAX"])
 
-    conn.close()
-    if not candidate:
-        return jsonify(card=None)
-    candidate["distance_km"] = candidate_distance
-    return jsonify(card=candidate)
+    filters = (q, category, listing_type, my_intent, max_km)
+    cards = queued_candidates(user_id, filters, batch or 1)
+    card = cards[0] if cards else None
+    if batch is None:
+        return jsonify(card=card)
+    return jsonify(card=card, cards=cards)
 
 
 @app.route("/api/match/swipe", methods=["POST"])
@@ -759,31 +3352,18 @@ def api_match_swipe():
         return jsonify(error="listing_id required"), 400
 
     conn = get_db_connection()
-    conn.execute(
-        """
-        INSERT INTO swipes (swiper_user_id, listing_id, decision, created_ts)
-        VALUES (?, ?, ?, ?)
-        ON CONFLICT(swiper_user_id, listing_id) DO UPDATE SET
-          decision=excluded.decision, created_ts=excluded.created_ts
-        """,
-        (user_id, listing_id, decision, now_ts()),
-    )
+    conn.execute(SQL_SWIPE_UPSERT, (user_id, listing_id, decision, now_ts()))
     conn.commit()
+    try:
+        forget_candidate(user_id, int(listing_id))
+    except (TypeError, ValueError):
+        pass
 
     matched = False
     match_id = None
 
     if decision == "yes":
-        reciprocal = conn.execute(
-            """
-            SELECT s.listing_id FROM swipes s
-            JOIN listings l ON l.id = s.listing_id
-            WHERE s.swiper_user_id = (SELECT owner_user_id FROM listings WHERE id = ?)
-            AND l.owner_user_id = ?
-            AND s.decision = 'yes'
-            """,
-            (listing_id, user_id),
-        ).fetchone()
+        reciprocal = conn.execute(SQL_RECIPROCAL, (listing_id, user_id)).fetchone()
 
         if reciprocal:
             other_listing = reciprocal["listing_id"]
@@ -803,47 +3383,124 @@ def api_match_swipe():
     return jsonify(success=True, matched=matched, match_id=match_id)
 
 
+@app.route("/api/match/swipes", methods=["POST"])
+def api_match_swipes():
+    """Bulk version of /api/match/swipe for clients that queue decisions offline.
+
+    Body: {"swipes": [{"listing_id": 1, "decision": "yes"}, ...]}. All decisions are
+    written in one transaction; returns every match the batch created.
+    """
+    user_id = ensure_user()
+    data = request.get_json(force=True)
+    if not isinstance(data, dict):
+        return jsonify(error="body must be a JSON object"), 400
+    items = data.get("swipes")
+    if not isinstance(items, list) or not items:
+        return jsonify(error="swipes must be a non-empty list"), 400
+    if len(items) > app.config["MATCH_SWIPE_BATCH_MAX"]:
+        return jsonify(error=f"at most {app.config['MATCH_SWIPE_BATCH_MAX']} swipes per request"), 400
+
+    decisions = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify(error=f"swipes[{i}] must be an object"), 400
+        decision = (item.get("decision") or "").strip().lower()
+        if decision not in ("yes", "no"):
+            return jsonify(error=f"swipes[{i}]: decision must be yes or no"), 400
+        try:
+            listing_id = int(item.get("listing_id"))
+        except (TypeError, ValueError):
+            return jsonify(error=f"swipes[{i}]: listing_id required"), 400
+        decisions[listing_id] = decision  # a later decision for the same listing wins
+
+    ts = now_ts()
+    liked = [lid for lid, d in decisions.items() if d == "yes"]
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.executemany(SQL_SWIPE_UPSERT, [(user_id, lid, d, ts) for lid, d in decisions.items()])
+            pairs = set()
+            if liked:
+                for r in conn.execute(SQL_RECIPROCAL_BATCH, (json.dumps(liked), user_id)):
+                    pairs.add(tuple(sorted((r["listing_id"], r["other_listing"]))))
+            pairs = sorted(pairs)
+            new_matches = []
+            if pairs:
+                existing = {
+                    (r["listing_a_id"], r["listing_b_id"])
+                    for r in conn.execute(SQL_MATCHES_BY_PAIRS, (json.dumps(pairs),))
+                }
+                fresh = [p for p in pairs if p not in existing]
+                if fresh:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO matches (listing_a_id, listing_b_id, created_ts) VALUES (?, ?, ?)",
+                        [(a, b, ts) for a, b in fresh],
+                    )
+                    new_matches = [
+                        {"match_id": r["id"], "listing_a_id": r["listing_a_id"], "listing_b_id": r["listing_b_id"]}
+                        for r in conn.execute(SQL_MATCHES_BY_PAIRS, (json.dumps(fresh),))
+                    ]
+    finally:
+        conn.close()
+
+    for listing_id in decisions:
+        forget_candidate(user_id, listing_id)
+    return jsonify(success=True, recorded=len(decisions), matched=bool(new_matches), matches=new_matches)
+
+
 @app.route("/api/matches")
 def api_matches():
     user_id = ensure_user()
     conn = get_db_connection()
-    rows = conn.execute(
-        """
-        SELECT m.id as match_id, m.created_ts,
-               la.id as a_id, la.query_text as a_text, la.intent as a_intent, la.listing_type as a_type, la.owner_user_id as a_owner,
-               lb.id as b_id, lb.query_text as b_text, lb.intent as b_intent, lb.listing_type as b_type, lb.owner_user_id as b_owner
-        FROM matches m
-        JOIN listings la ON la.id = m.listing_a_id
-        JOIN listings lb ON lb.id = m.listing_b_id
-        WHERE la.owner_user_id=? OR lb.owner_user_id=?
-        ORDER BY m.created_ts DESC LIMIT 50
-        """,
-        (user_id, user_id),
-    ).fetchall()
+    rows = conn.execute(SQL_MATCHES_FOR_USER, (user_id, user_id)).fetchall()
     conn.close()
     return jsonify(matches=[dict(r) for r in rows])
 
 
 @app.route("/api/leaderboard")
+@conditional_get("entries", "users", key=session_user)
 def api_leaderboard():
     user_id = ensure_user()
+    flush_entries()
     conn = get_db_connection()
-    rows = conn.execute(
-        """
-        SELECT
-            u.id,
-            COALESCE(u.display_name, 'Guest') as name,
-            COALESCE(SUM(e.points), 0) as total_points
-        FROM users u
-        LEFT JOIN entries e ON e.user_id = u.id
-        GROUP BY u.id
-        ORDER BY total_points DESC
-        """
-    ).fetchall()
+    rows = conn.execute(SQL_LEADERBOARD).fetchall()
     conn.close()
     return jsonify(leaderboard=[dict(r) for r in rows], current_user=user_id)
 
 
+@app.route("/api/leaderboard/top")
+@conditional_get("entries", "users", key=session_user)
+def api_leaderboard_top():
+    """Top-k users plus the caller's own rank, without shipping the whole table."""
+    user_id = ensure_user()
+    try:
+        k = min(max(int(request.args.get("k", 10)), 1), 100)
+    except Exception:
+        k = 10
+
+    flush_entries()
+    conn = get_db_connection()
+    rows = conn.execute(SQL_LEADERBOARD_TOP, (k,)).fetchall()
+    row = conn.execute(SQL_USER_POINTS, (user_id,)).fetchone()
+    my_points = row["total_points"] if row else 0
+    above = conn.execute(SQL_POINTS_RANK, (my_points,)).fetchone()[0]
+    me = conn.execute("SELECT COALESCE(display_name, 'Guest') as name FROM users WHERE id=?", (user_id,)).fetchone()
+    conn.close()
+
+    # competition ranks, the rule SQL_POINTS_RANK gives `me`: ties share the first tied position
+    top = []
+    for i, r in enumerate(rows):
+        entry = dict(r)
+        tied = top and top[-1]["total_points"] == entry["total_points"]
+        entry["rank"] = top[-1]["rank"] if tied else i + 1
+        top.append(entry)
+    return jsonify(
+        leaderboard=top,
+        me={"id": user_id, "name": me["name"] if me else "Guest", "total_points": my_points, "rank": above + 1},
+        current_user=user_id,
+    )
+
+
 # =========================
 # OAuth Routes
 # =========================
@@ -904,6 +3561,7 @@ def oauth_callback_google():
         (google_id, name, email, now_ts()),
     )
     conn.commit()
+    remember_user(google_id)
 
     row = conn.execute(
         "SELECT id, email FROM auth_users WHERE lower(email)=lower(?)", (email,)
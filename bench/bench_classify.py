@@ -0,0 +1,94 @@
+"""Benchmark heuristic_classify(): Aho-Corasick matcher vs. the old per-category any() scans.
+
+    python bench/bench_classify.py --sizes 10,100,1000,5000 --queries 2000
+
+Vocabulary sizes are keywords per category; the built-in keywords are always
+included so both implementations must agree on every query.
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app  # noqa: E402
+
+
+def legacy_classify(q, keywords):
+    """The implementation heuristic_classify() had before the automaton, with pluggable lists."""
+    qn = app.normalize(q)
+
+    def contains_any(words):
+        return any(w in qn for w in words)
+
+    for prio, (name, _) in enumerate(app.CLASSIFY_RULES):
+        if contains_any(keywords[name]):
+            return prio
+    return None
+
+
+def random_word(rng, lo=4, hi=10):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(lo, hi)))
+
+
+def make_keywords(rng, per_category):
+    keywords = {name: list(words) for name, words in app.CLASSIFY_KEYWORDS.items()}
+    for words in keywords.values():
+        while len(words) < per_category:
+            words.append(random_word(rng))
+    return keywords
+
+
+def make_queries(rng, keywords, n):
+    pool = [w for words in keywords.values() for w in words]
+    queries = []
+    for _ in range(n):
+        parts = [random_word(rng, 3, 8) for _ in range(rng.randint(1, 3))]
+        if rng.random() < 0.6:
+            parts.insert(rng.randint(0, len(parts)), rng.choice(pool))
+        queries.append(" ".join(parts))
+    return queries
+
+
+def timed(fn, queries, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for q in queries:
+            fn(q)
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,5000")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'keywords/category':>18} {'legacy us/query':>16} {'automaton us/query':>19} {'speedup':>8}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        keywords = make_keywords(rng, size)
+        queries = make_queries(rng, keywords, args.queries)
+        matcher = app.build_classify_matcher(keywords)
+
+        for q in queries:
+            expected = legacy_classify(q, keywords)
+            got = matcher.best(app.normalize(q))
+            assert got == expected, (q, expected, got)
+
+        legacy_us = timed(lambda q: legacy_classify(q, keywords), queries, args.repeat)
+        new_us = timed(lambda q: matcher.best(app.normalize(q)), queries, args.repeat)
+        print(f"{size:>18} {legacy_us:>16.2f} {new_us:>19.2f} {legacy_us / new_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark distance filtering: per-row haversine_km() vs. haversine_many() (pure Python and NumPy).
+
+    python bench/bench_haversine.py --sizes 10,64,100,1000,10000,100000
+
+Points are scattered around a centre roughly like listings in a metro area, with
+--missing of them lacking coordinates; all three paths must agree on every
+distance and mask. The NumPy column is skipped when NumPy is not installed.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app  # noqa: E402
+
+CENTRE = (40.7128, -74.0060)
+MAX_KM = 25.0
+
+
+def make_points(rng, n, missing):
+    lats, lons = [], []
+    for _ in range(n):
+        if rng.random() < missing:
+            lats.append(None)
+            lons.append(None)
+        else:
+            lats.append(CENTRE[0] + rng.uniform(-0.6, 0.6))
+            lons.append(CENTRE[1] + rng.uniform(-0.8, 0.8))
+    return lats, lons
+
+
+def scalar(lats, lons):
+    dist, mask = [], []
+    for la, lo in zip(lats, lons):
+        d = app.haversine_km(CENTRE[0], CENTRE[1], la, lo)
+        dist.append(d)
+        mask.append(d is not None and d <= MAX_KM)
+    return dist, mask
+
+
+def python_many(lats, lons):
+    numpy, app.np = app.np, None
+    try:
+        return app.haversine_many(CENTRE[0], CENTRE[1], lats, lons, MAX_KM)
+    finally:
+        app.np = numpy
+
+
+def numpy_many(lats, lons):
+    floor, app.HAVERSINE_NUMPY_MIN = app.HAVERSINE_NUMPY_MIN, 0
+    try:
+        return app.haversine_many(CENTRE[0], CENTRE[1], lats, lons, MAX_KM)
+    finally:
+        app.HAVERSINE_NUMPY_MIN = floor
+
+
+def check(expected, got):
+    for d0, d1 in zip(expected[0], got[0]):
+        assert (d0 is None and (d1 is None or math.isnan(d1))) or math.isclose(d0, d1, abs_tol=1e-9), (d0, d1)
+    assert [bool(m) for m in got[1]] == expected[1]
+
+
+def timed(fn, lats, lons, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(lats, lons)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,64,100,1000,10000,100000")
+    parser.add_argument("--missing", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'points':>8} {'scalar us':>11} {'python us':>11} {'numpy us':>10} {'python x':>9} {'numpy x':>8}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        lats, lons = make_points(rng, n, args.missing)
+        expected = scalar(lats, lons)
+        check(expected, python_many(lats, lons))
+        scalar_us = timed(scalar, lats, lons, args.repeat)
+        python_us = timed(python_many, lats, lons, args.repeat)
+        numpy_us = None
+        if app.np is not None:
+            check(expected, numpy_many(lats, lons))
+            numpy_us = timed(numpy_many, lats, lons, args.repeat)
+        print(f"{n:>8} {scalar_us:>11.1f} {python_us:>11.1f} "
+              + (f"{numpy_us:>10.1f}" if numpy_us else f"{'-':>10}")
+              + f" {scalar_us / python_us:>8.1f}x "
+              + (f"{scalar_us / numpy_us:>7.1f}x" if numpy_us else f"{'-':>8}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Load-test the main Flask routes against a synthetic database and report latency percentiles.
+
+    python bench/bench_routes.py --users 2000 --entries 200000 --listings 20000 --swipes 100000 \\
+        --requests 500 --concurrency 16 --out before.json
+    python bench/bench_routes.py ... --out after.json --compare before.json
+
+The database is seeded from scratch (or reused with --no-seed; seeding a --db file
+that already exists wipes its users and entries, so it needs --force), then every route
+is driven twice: sequentially through the Flask test client, and through a real
+HTTP server on localhost hit by --concurrency threads. Each request runs as one
+of the seeded users. Results (p50/p95/p99/mean in ms, requests/s, errors) are
+printed and written as JSON to --out.
+"""
+import argparse
+import http.client
+import importlib
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import quote, urlencode
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CATEGORIES = ["Plastic", "Metal", "Glass", "Paper", "Electronics", "Textiles", "Organic"]
+UNKNOWN_ITEMS = ["broken umbrella", "old toothbrush", "phone charger", "coffee pod", "garden hose"]
+CENTER = (40.73, -73.99)
+
+
+def seed(app, args, rng):
+    conn = app.get_db_connection()
+    for table in ("matches", "swipes", "listings", "entries", "users"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.commit()
+
+    start = datetime(2024, 1, 1)
+    users = []
+    for i in range(args.users):
+        lat = CENTER[0] + rng.uniform(-0.5, 0.5)
+        lon = CENTER[1] + rng.uniform(-0.5, 0.5)
+        users.append((f"bench-user-{i}", f"User {i}", f"1{i % 1000:04d}", lat, lon, start.isoformat()))
+    conn.executemany(
+        "INSERT INTO users (id, display_name, zip, lat, lon, created_ts) VALUES (?, ?, ?, ?, ?, ?)", users)
+
+    names = list(app.ITEMS.keys())
+    entries = []
+    for i in range(args.entries):
+        name = rng.choice(names)
+        info = app.ITEMS[name]
+        ts = start + timedelta(seconds=i * 30)
+        amount = float(rng.randint(1, 5))
+        entries.append((name, amount, ts.date().isoformat(), ts.isoformat(), info["material"], amount,
+                        info["bin"], ", ".join(info["prep"]), info["notes"], info["link"], rng.choice(users)[0]))
+    conn.executemany(app.SQL_ENTRY_INSERT, entries)
+
+    listings = []
+    for i in range(args.listings):
+        owner = rng.choice(users)
+        lat = owner[3] + rng.uniform(-0.01, 0.01)
+        lon = owner[4] + rng.uniform(-0.01, 0.01)
+        listings.append((owner[0], rng.choice(("waste", "part")), rng.choice(("offer", "need")),
+                         rng.choice(CATEGORIES), rng.choice(names), owner[2], lat, lon,
+                         app.geohash_encode(lat, lon), (start + timedelta(minutes=i)).isoformat()))
+    conn.executemany(
+        "INSERT INTO listings (owner_user_id, listing_type, intent, category, query_text, zip, lat, lon, geohash, created_ts) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", listings)
+
+    swipes = [(rng.choice(users)[0], rng.randint(1, max(1, args.listings)), rng.choice(("yes", "no")),
+               start.isoformat()) for _ in range(args.swipes if args.listings else 0)]
+    conn.executemany(
+        "INSERT OR IGNORE INTO swipes (swiper_user_id, listing_id, decision, created_ts) VALUES (?, ?, ?, ?)", swipes)
+    conn.commit()
+    conn.close()
+
+
+def route_table(app, n_listings):
+    """(name, method, request builder) for every route under test; builders return (path, form, json)."""
+    names = list(app.ITEMS.keys())
+
+    def item(rng):
+        return "/recycling/item", {"item": rng.choice(names + UNKNOWN_ITEMS), "amount": "1"}, None
+
+    def lookup(rng):
+        return "/api/lookup?q=" + quote(rng.choice(names + UNKNOWN_ITEMS)), None, None
+
+    def autocomplete(rng):
+        name = rng.choice(names)
+        return "/api/autocomplete?q=" + quote(name[:rng.randint(1, 4)]), None, None
+
+    def match_next(rng):
+        return "/api/match/next?" + urlencode({"listing_type": rng.choice(("waste", "part")), "max_km": 25}), None, None
+
+    def match_swipe(rng):
+        body = {"listing_id": rng.randint(1, max(1, n_listings)), "decision": rng.choice(("yes", "no"))}
+        return "/api/match/swipe", None, body
+
+    def leaderboard(rng):
+        return "/api/leaderboard", None, None
+
+    def matches(rng):
+        return "/api/matches", None, None
+
+    return [
+        ("POST /recycling/item", "POST", item),
+        ("GET /api/lookup", "GET", lookup),
+        ("GET /api/autocomplete", "GET", autocomplete),
+        ("GET /api/match/next", "GET", match_next),
+        ("POST /api/match/swipe", "POST", match_swipe),
+        ("GET /api/leaderboard", "GET", leaderboard),
+        ("GET /api/matches", "GET", matches),
+    ]
+
+
+def summarize(latencies, errors, wall):
+    latencies = sorted(latencies)
+
+    def pct(p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, max(0, int(round(p / 100 * len(latencies))) - 1))] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        "rps": round(len(latencies) / wall, 1) if wall > 0 else None,
+    }
+
+
+def login_clients(app, user_ids):
+    """One test client per user with its session bound to that seeded user."""
+    clients = []
+    for user_id in user_ids:
+        client = app.app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = user_id
+        clients.append(client)
+    return clients
+
+
+def run_test_client(clients, routes, n, warmup, rng):
+    results = {}
+    for name, method, build in routes:
+        latencies, errors = [], 0
+        for i in range(warmup + n):
+            client = clients[i % len(clients)]
+            path, form, body = build(rng)
+            start = time.perf_counter()
+            if method == "GET":
+                resp = client.get(path)
+            else:
+                resp = client.post(path, data=form, json=body)
+            elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            latencies.append(elapsed)
+            errors += resp.status_code >= 400
+        results[name] = summarize(latencies, errors, sum(latencies))
+    return results
+
+
+def http_request(port, method, path, form, body, cookie):
+    headers = {"Cookie": cookie}
+    payload = None
+    if form is not None:
+        payload = urlencode(form)
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    elif body is not None:
+        payload = json.dumps(body)
+        headers["Content-Type"] = "application/json"
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request(method, path, body=payload, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status
+    finally:
+        conn.close()
+
+
+def run_http(app, cookies, routes, n, warmup, concurrency, rng):
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_port
+
+    def one(i, method, request):
+        path, form, body = request
+        start = time.perf_counter()
+        try:
+            status = http_request(port, method, path, form, body, cookies[i % len(cookies)])
+        except OSError:
+            status = 599
+        return time.perf_counter() - start, status
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for name, method, build in routes:
+                requests = [build(rng) for _ in range(warmup + n)]
+                list(pool.map(lambda i: one(i, method, requests[i]), range(warmup)))
+                start = time.perf_counter()
+                done = list(pool.map(lambda i: one(i, method, requests[i]), range(warmup, warmup + n)))
+                wall = time.perf_counter() - start
+                results[name] = summarize([d for d, _ in done], sum(s >= 400 for _, s in done), wall)
+    finally:
+        server.shutdown()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, previous=None):
+    for mode, routes in results.items():
+        print(f"\n[{mode}]")
+        print(f"{'route':<24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>6}"
+              + (f" {'p50 vs prev':>12}" if previous else ""))
+        for name, r in routes.items():
+            line = f"{name:<24} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['rps']:>8.1f} {r['errors']:>6}"
+            old = (previous or {}).get(mode, {}).get(name)
+            if old and old.get("p50_ms"):
+                line += f" {(r['p50_ms'] / old['p50_ms'] - 1) * 100:>+11.1f}%"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database file (default: a fresh temp file)")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data already in --db")
+    parser.add_argument("--force", action="store_true", help="allow seeding (wiping) an existing --db file")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--entries", type=int, default=50000)
+    parser.add_argument("--listings", type=int, default=10000)
+    parser.add_argument("--swipes", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=300, help="measured requests per route and mode")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=("both", "testclient", "http"), default="both")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--out", default="bench_routes.json")
+    parser.add_argument("--compare", help="earlier --out file to print p50 deltas against")
+    args = parser.parse_args()
+
+    if args.db and not args.no_seed and os.path.exists(args.db) and not args.force:
+        parser.error(f"{args.db} exists and seeding would delete its data; pass --no-seed to reuse it "
+                     "or --force to wipe it")
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_routes_")
+    try:
+        run(args, parser, previous, workdir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args, parser, previous, workdir):
+    out_path = os.path.abspath(args.out)
+    os.environ["DB_PATH"] = os.path.abspath(args.db) if args.db else os.path.join(workdir, "recycling.db")
+    # filesystem sessions and other relative paths land next to the temp database
+    os.chdir(workdir)
+    sys.path.insert(0, REPO)
+    app = importlib.import_module("app")
+
+    rng = random.Random(args.seed)
+    if not args.no_seed:
+        started = time.perf_counter()
+        seed(app, args, rng)
+        print(f"seeded {os.environ['DB_PATH']} in {time.perf_counter() - started:.1f}s")
+
+    conn = app.get_db_connection()
+    user_ids = [r["id"] for r in conn.execute("SELECT id FROM users ORDER BY id LIMIT 256")]
+    n_listings = conn.execute("SELECT COALESCE(MAX(id), 0) FROM listings").fetchone()[0]
+    conn.close()
+    if not user_ids:
+        parser.error("the database has no users; drop --no-seed or seed it first")
+
+    routes = route_table(app, n_listings)
+    clients = login_clients(app, user_ids)
+    cookie_name = app.app.config["SESSION_COOKIE_NAME"]
+    cookies = [f"{cookie_name}={c.get_cookie(cookie_name).value}" for c in clients]
+
+    results = {}
+    if args.mode in ("both", "testclient"):
+        results["testclient"] = run_test_client(clients, routes, args.requests, args.warmup, rng)
+    if args.mode in ("both", "http"):
+        results["http"] = run_http(app, cookies, routes, args.requests, args.warmup, args.concurrency, rng)
+    app.flush_entries()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "sizes": {"users": args.users, "entries": args.entries, "listings": args.listings,
+                      "swipes": args.swipes, "seeded": not args.no_seed},
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "config": {k: app.app.config.get(k) for k in (
+                "DB_POOL_SIZE", "DB_JOURNAL_MODE", "DB_SYNCHRONOUS", "SESSION_BACKEND", "ENTRY_WRITE_MODE")},
+        },
+        "results": results,
+    }
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    app.close_pool()
+    print_results(results, previous)
+    print(f"\nwrote {out_path}")
+
+
+if __name__ == "__main__":
+    main()
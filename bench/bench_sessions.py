@@ -0,0 +1,86 @@
+"""Benchmark per-request session overhead: Flask-Session filesystem vs. the sqlite and memory stores.
+
+    python bench/bench_sessions.py --requests 2000 --clients 50
+
+Each backend gets a bare Flask app with two routes shaped like the real ones:
+"read" only looks at counts/history (like /api/stats), "write" bumps a count and
+appends to the 50-entry history (like POST /recycling/item). Requests rotate over
+--clients cookie jars so the store holds several live sessions.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app  # noqa: E402
+from flask import Flask, jsonify, session  # noqa: E402
+
+
+def make_app(backend, workdir):
+    bench_app = Flask(f"bench_{backend}")
+    bench_app.secret_key = "bench"
+    bench_app.config["SESSION_PERMANENT"] = False
+    bench_app.config["DB_POOL_SIZE"] = 4
+    bench_app.config["DB_BUSY_TIMEOUT_MS"] = 5000
+    if backend == "filesystem":
+        bench_app.config["SESSION_TYPE"] = "filesystem"
+        bench_app.config["SESSION_FILE_DIR"] = os.path.join(workdir, "flask_session")
+        app.Session(bench_app)
+    elif backend == "sqlite":
+        bench_app.session_interface = app.SqliteSessionInterface(bench_app, os.path.join(workdir, "sessions.db"))
+    else:
+        bench_app.session_interface = app.MemorySessionInterface(bench_app)
+
+    @bench_app.route("/read")
+    def read():
+        return jsonify(counts=session.get("counts", {}), history=session.get("history", []))
+
+    @bench_app.route("/write")
+    def write():
+        counts = session.get("counts", {"Recycle": 0, "Compost": 0, "Landfill": 0})
+        counts["Recycle"] += 1
+        session["counts"] = counts
+        history = session.get("history", [])
+        history.append({"ts": app.now_ts(), "item": "plastic bottle", "bin": "Recycle", "points": 10})
+        session["history"] = history[-50:]
+        return jsonify(success=True)
+
+    return bench_app
+
+
+def run(clients, path, n):
+    start = time.perf_counter()
+    for i in range(n):
+        clients[i % len(clients)].get(path)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--backends", default="filesystem,sqlite,memory")
+    args = parser.parse_args()
+
+    print(f"{'backend':>10} {'write us/req':>13} {'read us/req':>12}")
+    for backend in args.backends.split(","):
+        workdir = tempfile.mkdtemp()
+        try:
+            bench_app = make_app(backend, workdir)
+            clients = [bench_app.test_client() for _ in range(args.clients)]
+            # fill every history to its 50-entry cap so writes carry the full payload
+            run(clients, "/write", args.clients * 50)
+            write_us = run(clients, "/write", args.requests)
+            read_us = run(clients, "/read", args.requests)
+            print(f"{backend:>10} {write_us:>13.1f} {read_us:>12.1f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark the /api/match/next candidate query for heavy swipers: NOT IN subquery vs. NOT EXISTS anti-join.
+
+    python bench/bench_swipes.py --listings 50000 --swipes 1000,10000,40000
+
+Two swipe patterns are measured: "newest" (the user swiped the newest N
+listings, so every call has to skip past all of them) and "scattered" (N
+random listings, so the page fills almost immediately).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app  # noqa: E402
+
+LEGACY_QUERY = """
+    SELECT l.* FROM listings l WHERE
+      l.active=1
+      AND l.owner_user_id != ?
+      AND l.listing_type = ?
+      AND l.id NOT IN (SELECT listing_id FROM swipes WHERE swiper_user_id = ?)
+    ORDER BY l.created_ts DESC LIMIT 80
+"""
+
+
+def seed(conn, n_listings, rng):
+    conn.execute("DELETE FROM swipes")
+    conn.execute("DELETE FROM listings")
+    conn.executemany(
+        "INSERT INTO listings (id, owner_user_id, listing_type, intent, category, query_text, created_ts) "
+        "VALUES (?, ?, 'waste', 'offer', 'Plastic', 'bottles', ?)",
+        [(i, f"owner-{rng.randrange(500)}", f"2024-01-01T00:00:{i:08d}") for i in range(1, n_listings + 1)],
+    )
+    conn.commit()
+
+
+def swipe(conn, user_id, listing_ids):
+    conn.execute("DELETE FROM swipes WHERE swiper_user_id=?", (user_id,))
+    conn.executemany(
+        "INSERT INTO swipes (swiper_user_id, listing_id, decision, created_ts) VALUES (?, ?, 'no', '2024')",
+        [(user_id, lid) for lid in listing_ids],
+    )
+    conn.commit()
+
+
+def timed(conn, sql, params, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, [r["id"] for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=50000)
+    parser.add_argument("--swipes", default="1000,10000,40000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    user_id = "heavy-swiper"
+    conn = app.get_db_connection()
+    seed(conn, args.listings, rng)
+
+    print(f"{'pattern':>10} {'swipes':>8} {'NOT IN ms':>10} {'NOT EXISTS ms':>14} {'speedup':>8}")
+    for pattern in ("newest", "scattered"):
+        for n_swipes in [min(int(x), args.listings) for x in args.swipes.split(",")]:
+            if pattern == "newest":
+                ids = range(args.listings, args.listings - n_swipes, -1)
+            else:
+                ids = rng.sample(range(1, args.listings + 1), n_swipes)
+            swipe(conn, user_id, ids)
+            legacy_ms, legacy_ids = timed(conn, LEGACY_QUERY, (user_id, "waste", user_id), args.repeat)
+            sql, params = app.match_next_query(user_id, "waste")
+            new_ms, new_ids = timed(conn, sql, params, args.repeat)
+            assert legacy_ids == new_ids
+            print(f"{pattern:>10} {n_swipes:>8} {legacy_ms:>10.2f} {new_ms:>14.2f} {legacy_ms / new_ms:>7.1f}x")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
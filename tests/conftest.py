@@ -0,0 +1,58 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# app reads its config and migrates DB_PATH at import, so point it somewhere disposable first
+_workdir = tempfile.mkdtemp(prefix="recycling_tests_")
+atexit.register(shutil.rmtree, _workdir, True)
+os.environ["DB_PATH"] = os.path.join(_workdir, "import.db")
+os.environ["SESSION_BACKEND"] = "memory"
+os.environ["ENTRY_WRITE_MODE"] = "sync"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    """An empty database file behind app's connection pool, with every per-process cache reset."""
+    monkeypatch.setitem(app_module.app.config, "DB_PATH", str(tmp_path / "test.db"))
+    for name, value in (("_pool", None), ("_fts_ready", None), ("_item_index", None),
+                        ("_items_version", None), ("_items_checked", 0.0)):
+        monkeypatch.setattr(app_module, name, value)
+    app_module._known_users.clear()
+    for cache in (app_module.match_queues, app_module.response_cache, app_module.lookup_cache):
+        cache.clear()
+    yield
+    app_module.close_pool()
+
+
+@pytest.fixture
+def db(empty_db):
+    conn = app_module.get_pool().acquire()
+    try:
+        app_module.migrate(conn)
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def conn(db):
+    c = app_module.get_db_connection()
+    yield c
+    c.close()
+
+
+@pytest.fixture
+def client(db):
+    return app_module.app.test_client()
+
+
+def new_user(client, **me):
+    client.post("/api/me", json=dict({"display_name": "someone"}, **me))
+    with client.session_transaction() as sess:
+        return sess["user_id"]
@@ -0,0 +1,119 @@
+import random
+
+import app
+from conftest import new_user
+
+AGGREGATES = ("user_points", "user_breakdown") + tuple(app.ROLLUP_TABLES)
+
+
+def snapshot(conn):
+    """Aggregate rows with float noise rounded away; zero-count rows equal missing ones."""
+    out = {}
+    for table in AGGREGATES:
+        rows = set()
+        for r in conn.execute(f"SELECT * FROM {table}"):
+            if r["entry_count"] == 0:
+                continue
+            rows.add(tuple(round(v, 6) if isinstance(v, float) else v for v in r))
+        out[table] = rows
+    return out
+
+
+def random_entry(rng):
+    return {
+        "user_id": rng.choice(["u1", "u2", "u3", None]),
+        "date": f"2024-0{rng.randint(1, 3)}-{rng.randint(1, 28):02d}",
+        "bin": rng.choice(["Recycle", "Compost", "Landfill"]),
+        "material": rng.choice(["Plastic", "Glass", "Paper", ""]),
+        "amount": rng.choice([0.5, 1.0, 2.0]),
+        "points": rng.choice([0.0, 2.5, 10.0]),
+    }
+
+
+def test_triggers_agree_with_full_rebuild(conn):
+    rng = random.Random(5)
+    for _ in range(400):
+        op = rng.random()
+        ids = [r[0] for r in conn.execute("SELECT id FROM entries")]
+        if op < 0.6 or not ids:
+            e = random_entry(rng)
+            conn.execute(
+                "INSERT INTO entries (item, ts, user_id, date, bin, material, amount, points) "
+                "VALUES ('x', 'ts', :user_id, :date, :bin, :material, :amount, :points)", e)
+        elif op < 0.8:
+            e = random_entry(rng)
+            e["id"] = rng.choice(ids)
+            conn.execute(
+                "UPDATE entries SET user_id=:user_id, date=:date, bin=:bin, material=:material, "
+                "amount=:amount, points=:points WHERE id=:id", e)
+        else:
+            conn.execute("DELETE FROM entries WHERE id=?", (rng.choice(ids),))
+    conn.commit()
+    incremental = snapshot(conn)
+
+    app.rebuild_user_aggregates(conn)
+    app.rebuild_entry_rollups(conn)
+    conn.commit()
+    assert incremental == snapshot(conn)
+
+
+def entry_triggers(conn):
+    return conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND tbl_name='entries' ORDER BY name").fetchall()
+
+
+def test_truncate_entries_clears_aggregates_and_keeps_triggers(conn):
+    rng = random.Random(9)
+    for _ in range(50):
+        conn.execute(
+            "INSERT INTO entries (item, ts, user_id, date, bin, material, amount, points) "
+            "VALUES ('x', 'ts', :user_id, :date, :bin, :material, :amount, :points)", random_entry(rng))
+    conn.commit()
+    triggers = [tuple(r) for r in entry_triggers(conn)]
+    version = app.data_version(conn, "entries")
+
+    app.truncate_entries(conn)
+
+    assert conn.execute("SELECT COUNT(1) FROM entries").fetchone()[0] == 0
+    assert all(not rows for rows in snapshot(conn).values())
+    assert [tuple(r) for r in entry_triggers(conn)] == triggers
+    assert app.data_version(conn, "entries") == version + 1
+
+    conn.execute("INSERT INTO entries (item, ts, user_id, date, bin, material, amount, points) "
+                 "VALUES ('x', 'ts', 'u1', '2024-01-01', 'Recycle', 'Plastic', 1, 10)")
+    conn.commit()
+    assert [tuple(r) for r in conn.execute("SELECT total_points, entry_count FROM user_points")] == [(10.0, 1)]
+    assert conn.execute("SELECT COUNT(1) FROM rollup_daily").fetchone()[0] == 2
+
+
+def test_clear_entries_resets_totals(client):
+    new_user(client)
+    client.post("/recycling/item", data={"item": "plastic bottle", "amount": 2})
+    conn = app.get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(1) FROM user_points").fetchone()[0] == 1
+        assert client.post("/api/clear_entries").status_code == 200
+        assert conn.execute("SELECT COUNT(1) FROM entries").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(1) FROM user_points").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_leaderboard_top_ranks_ties_like_me(client):
+    me = new_user(client)
+    conn = app.get_db_connection()
+    try:
+        for user_id, points in [("a", 30), ("b", 20), (me, 20), ("c", 20), ("d", 10)]:
+            conn.execute("INSERT INTO entries (item, ts, user_id, date, bin, material, amount, points) "
+                         "VALUES ('x', 'ts', ?, '2024-01-01', 'Recycle', 'Plastic', 1, ?)", (user_id, points))
+        conn.commit()
+    finally:
+        conn.close()
+
+    data = client.get("/api/leaderboard/top?k=10").get_json()
+    assert {u["id"]: u["rank"] for u in data["leaderboard"]} == {"a": 1, "b": 2, me: 2, "c": 2, "d": 5}
+    assert data["me"]["rank"] == 2
+    # cut inside the tie: the caller's row is gone but their rank still matches the rows'
+    data = client.get("/api/leaderboard/top?k=2").get_json()
+    assert [u["rank"] for u in data["leaderboard"]] == [1, 2]
+    assert data["me"]["rank"] == 2
@@ -0,0 +1,52 @@
+import random
+import string
+
+import pytest
+
+import app
+
+
+def linear_best(text, keywords):
+    """What heuristic_classify() did before the automaton: first rule with any keyword in the text."""
+    for prio, (name, _) in enumerate(app.CLASSIFY_RULES):
+        if any(w in text for w in keywords[name]):
+            return prio
+    return None
+
+
+def random_word(rng, lo=2, hi=8):
+    return "".join(rng.choice(string.ascii_lowercase[:8]) for _ in range(rng.randint(lo, hi)))
+
+
+@pytest.mark.parametrize("per_category", [0, 5, 200])
+def test_matcher_agrees_with_linear_scan(per_category):
+    rng = random.Random(per_category)
+    # a small alphabet makes keywords overlap and nest, which is where Aho-Corasick goes wrong
+    keywords = {name: list(words) for name, words in app.CLASSIFY_KEYWORDS.items()}
+    for words in keywords.values():
+        words.extend(random_word(rng) for _ in range(per_category))
+    matcher = app.build_classify_matcher(keywords)
+    pool = [w for words in keywords.values() for w in words]
+    for _ in range(2000):
+        parts = [random_word(rng, 1, 10) for _ in range(rng.randint(0, 3))]
+        if rng.random() < 0.5:
+            parts.insert(rng.randint(0, len(parts)), rng.choice(pool))
+        text = app.normalize(" ".join(parts))
+        assert matcher.best(text) == linear_best(text, keywords), text
+
+
+def test_earlier_rule_wins():
+    # "battery" is hazardous, "phone" e-waste; hazardous comes first
+    assert app.heuristic_classify("phone battery")["material"] == "Hazardous"
+    assert app.heuristic_classify("old phone")["bin"] == app.CLASSIFY_RULES[1][1]["bin"]
+    assert app.heuristic_classify("zzz")["material"] == "Unknown"
+
+
+def test_extra_keywords_must_name_a_category(tmp_path):
+    path = tmp_path / "keywords.json"
+    path.write_text('{"ewaste": ["Game Console"]}')
+    keywords = app.load_classify_keywords(str(path))
+    assert "game console" in keywords["ewaste"]
+    path.write_text('{"plutonium": ["x"]}')
+    with pytest.raises(ValueError):
+        app.load_classify_keywords(str(path))
@@ -0,0 +1,26 @@
+import app
+
+
+def test_leaderboard_revalidates_for_first_time_visitor(client):
+    first = client.get("/api/leaderboard")
+    assert first.status_code == 200
+    again = client.get("/api/leaderboard", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    conn = app.get_db_connection()
+    try:
+        assert conn.execute("SELECT COUNT(1) FROM users").fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def test_autocomplete_revalidates_from_memory(client, monkeypatch):
+    first = client.get("/api/autocomplete?q=bot")
+    assert first.status_code == 200
+    opened = []
+    real = app.get_db_connection
+    monkeypatch.setattr(app, "get_db_connection", lambda: opened.append(1) or real())
+    for _ in range(3):
+        again = client.get("/api/autocomplete?q=bot", headers={"If-None-Match": first.headers["ETag"]})
+        assert again.status_code == 304
+    assert client.get("/api/autocomplete?q=bot").status_code == 200
+    assert opened == []
@@ -0,0 +1,43 @@
+import math
+import random
+
+import pytest
+
+import app
+
+
+def points(rng, n):
+    lats = [None if rng.random() < 0.1 else rng.uniform(40, 41.5) for _ in range(n)]
+    lons = [None if la is None else rng.uniform(-75, -73) for la in lats]
+    return lats, lons
+
+
+def check_many(lats, lons, dist, mask, max_km):
+    for la, lo, d, m in zip(lats, lons, dist, mask):
+        expected = app.haversine_km(40.7, -74.0, la, lo)
+        if expected is None:
+            assert d is None or math.isnan(d)
+            assert not m
+        else:
+            assert d == pytest.approx(expected, abs=1e-9)
+            assert bool(m) == (max_km is None or expected <= max_km)
+
+
+@pytest.mark.parametrize("max_km", [None, 30.0])
+def test_haversine_many_pure_python_matches_scalar(monkeypatch, max_km):
+    monkeypatch.setattr(app, "np", None)
+    lats, lons = points(random.Random(3), 200)
+    dist, mask = app.haversine_many(40.7, -74.0, lats, lons, max_km)
+    check_many(lats, lons, dist, mask, max_km)
+
+
+@pytest.mark.skipif(app.np is None, reason="NumPy is not installed")
+@pytest.mark.parametrize("max_km", [None, 30.0])
+def test_haversine_many_numpy_matches_scalar(max_km):
+    lats, lons = points(random.Random(4), 200)
+    dist, mask = app.haversine_many(40.7, -74.0, lats, lons, max_km)
+    check_many(lats, lons, dist, mask, max_km)
+
+
+def test_haversine_many_without_origin():
+    assert app.haversine_many(None, -74.0, [40.0], [-74.0], 10) == ([None], [False])
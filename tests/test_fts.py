@@ -0,0 +1,61 @@
+import app
+
+
+def fts_names(conn):
+    return app.fts_schema(conn) & set(app.FTS_TABLES + app.FTS_TRIGGERS)
+
+
+def test_database_migrated_without_fts_gains_it_later(empty_db, monkeypatch):
+    probe = app.fts5_trigram_available
+    monkeypatch.setattr(app, "fts5_trigram_available", lambda: False)
+    conn = app.get_pool().acquire()
+    app.migrate(conn)
+    conn.close()
+
+    conn = app.get_db_connection()
+    try:
+        assert fts_names(conn) == set()
+        assert not app.use_fts("bottle")
+        # LIKE fallback answers text queries
+        assert [r["name"] for r in app.search_items(conn, "bottle")]
+        sql, params = app.match_next_query("u", "waste", q="bottle")
+        conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+    # the same database opened by a build with trigram FTS5 again
+    monkeypatch.setattr(app, "fts5_trigram_available", probe)
+    app._fts_ready = None
+    conn = app.get_db_connection()
+    try:
+        assert app.use_fts("bottle")
+        assert fts_names(conn) == set(app.FTS_TABLES + app.FTS_TRIGGERS)
+        names = [r["name"] for r in app.search_items(conn, "bottle")]
+        assert "Plastic bottle" in names
+    finally:
+        conn.close()
+
+
+def test_sqlite_without_fts_drops_sync_triggers_and_rebuild_catches_up(conn, monkeypatch):
+    assert app.use_fts("bottle")
+    probe = app.fts5_trigram_available
+    monkeypatch.setattr(app, "fts5_trigram_available", lambda: False)
+    monkeypatch.setattr(app, "_fts_ready", None)
+    other = app.get_db_connection()
+    try:
+        assert app.fts_schema(other) & set(app.FTS_TRIGGERS) == set()
+        other.execute("INSERT INTO items (name, material, bin) VALUES ('Pizza box', 'Paper', 'Compost')")
+        other.commit()
+        assert [r["name"] for r in app.search_items(other, "pizza")] == ["Pizza box"]
+    finally:
+        other.close()
+
+    # the same database opened by a build with trigram FTS5 again
+    monkeypatch.setattr(app, "fts5_trigram_available", probe)
+    app._fts_ready = None
+    other = app.get_db_connection()
+    try:
+        assert app.use_fts("pizza")
+        assert [r["name"] for r in app.search_items(other, "pizza")] == ["Pizza box"]
+    finally:
+        other.close()
@@ -0,0 +1,59 @@
+import math
+import random
+
+import pytest
+
+import app
+
+
+def destination(lat, lon, bearing_deg, km):
+    """Point km away from (lat, lon) on the haversine sphere."""
+    d = km / app.EARTH_RADIUS_KM
+    la1, b = math.radians(lat), math.radians(bearing_deg)
+    la2 = math.asin(math.sin(la1) * math.cos(d) + math.cos(la1) * math.sin(d) * math.cos(b))
+    lo2 = math.radians(lon) + math.atan2(math.sin(b) * math.sin(d) * math.cos(la1),
+                                         math.cos(d) - math.sin(la1) * math.sin(la2))
+    return math.degrees(la2), (math.degrees(lo2) + 540.0) % 360.0 - 180.0
+
+
+def test_km_per_degree_matches_haversine():
+    assert app.haversine_km(0.0, 0.0, 1.0, 0.0) == pytest.approx(app.KM_PER_DEG_LAT)
+
+
+def test_geohash_cover_contains_every_point_of_the_circle():
+    rng = random.Random(1)
+    for _ in range(3000):
+        lat, lon = rng.uniform(-80, 80), rng.uniform(-179, 179)
+        radius = rng.choice([1, 5, 25, 120, 300])
+        cells = app.geohash_cover(lat, lon, radius)
+        if cells is None:
+            continue
+        plat, plon = destination(lat, lon, rng.uniform(0, 360), radius * 0.9999)
+        assert app.haversine_km(lat, lon, plat, plon) <= radius
+        gh = app.geohash_encode(plat, plon)
+        assert any(gh.startswith(c) for c in cells), (lat, lon, radius, plat, plon)
+
+
+def add_listing(conn, lat, lon):
+    conn.execute(
+        "INSERT INTO listings (owner_user_id, listing_type, intent, category, query_text, lat, lon, geohash, created_ts) "
+        "VALUES ('owner', 'waste', 'offer', 'Paper', 'box', ?, ?, ?, 'ts')",
+        (lat, lon, app.geohash_encode(lat, lon)),
+    )
+
+
+def test_nearest_listings_agrees_with_brute_force(conn):
+    rng = random.Random(2)
+    centre = (40.0, -74.0)
+    # listings just inside the radius in the four directions the prefilter box is tightest
+    for bearing in (0, 90, 180, 270):
+        add_listing(conn, *destination(*centre, bearing, 119.99))
+    for _ in range(300):
+        add_listing(conn, *destination(*centre, rng.uniform(0, 360), rng.uniform(0, 200)))
+    conn.commit()
+
+    found = app.nearest_listings(conn, "me", "waste", *centre, 120.0, limit=1000)
+    expected = {r["id"] for r in conn.execute("SELECT id, lat, lon FROM listings")
+                if app.haversine_km(*centre, r["lat"], r["lon"]) <= 120.0}
+    assert {c["id"] for c in found} == expected
+    assert {1, 2, 3, 4} <= expected
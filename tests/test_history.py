@@ -0,0 +1,4 @@
+def test_history_rejects_ranges_before_date_min(client):
+    assert client.get("/api/history?end=0001-01-01").status_code == 400
+    assert client.get("/api/history?end=0001-01-20&period=week").status_code == 400
+    assert client.get("/api/history?end=2024-01-31").status_code == 200
@@ -0,0 +1,72 @@
+import app
+from conftest import new_user
+
+
+def add_listings(client, n):
+    for i in range(n):
+        assert client.post("/api/listings", json={
+            "listing_type": "waste", "intent": "offer", "category": "Plastic", "query_text": f"bottle {i}",
+        }).status_code == 200
+
+
+def test_match_next_rejects_non_finite_max_km(client):
+    new_user(client)
+    for value in ("nan", "inf", "-inf"):
+        assert client.get(f"/api/match/next?max_km={value}").status_code == 400
+    assert client.get("/api/match/next?max_km=10").status_code == 200
+
+
+def test_queue_skips_cards_swiped_through_another_worker(db):
+    owner, swiper = app.app.test_client(), app.app.test_client()
+    new_user(owner)
+    add_listings(owner, 5)
+    user_id = new_user(swiper)
+    first = [c["id"] for c in swiper.get("/api/match/next?batch=3").get_json()["cards"]]
+
+    # written by another process: this worker's forget_candidate() never runs
+    conn = app.get_db_connection()
+    conn.execute("INSERT INTO swipes (swiper_user_id, listing_id, decision, created_ts) VALUES (?, ?, 'no', 'ts')",
+                 (user_id, first[0]))
+    conn.commit()
+    conn.close()
+
+    again = [c["id"] for c in swiper.get("/api/match/next?batch=3").get_json()["cards"]]
+    assert first[0] not in again
+    assert len(again) == 3
+
+
+def test_queues_per_user_are_capped(client, monkeypatch):
+    monkeypatch.setitem(app.app.config, "MATCH_QUEUE_MAX_FILTERS", 3)
+    user_id = new_user(client)
+    for i in range(10):
+        client.get(f"/api/match/next?q=word{i}")
+    assert len(app.match_queues.get(user_id).values()) == 3
+
+
+def test_swiped_cards_are_pruned_when_the_queue_was_evicted(db, monkeypatch):
+    owner, swiper = app.app.test_client(), app.app.test_client()
+    new_user(owner)
+    add_listings(owner, 30)
+    user_id = new_user(swiper)
+    first = [c["id"] for c in swiper.get("/api/match/next?batch=5").get_json()["cards"]]
+
+    conn = app.get_db_connection()
+    conn.executemany("INSERT INTO swipes (swiper_user_id, listing_id, decision, created_ts) VALUES (?, ?, 'no', 'ts')",
+                     [(user_id, listing_id) for listing_id in first])
+    conn.commit()
+    conn.close()
+
+    # the queue drops out of match_queues while the request is using it (POST /api/me, LRU, TTL)
+    lookups = []
+    swiped_among = app.swiped_among
+
+    def evicting_swiped_among(uid, ids):
+        lookups.append(ids)
+        app.match_queues.pop(uid)
+        return swiped_among(uid, ids)
+
+    monkeypatch.setattr(app, "swiped_among", evicting_swiped_among)
+    again = [c["id"] for c in swiper.get("/api/match/next?batch=5").get_json()["cards"]]
+    assert not set(first) & set(again)
+    assert len(again) == 5
+    assert len(lookups) <= app.QUEUE_PRUNE_ROUNDS
@@ -0,0 +1,60 @@
+import app
+
+
+def entries_rows(n):
+    return [("item", 1.0, f"2024-01-{1 + i % 28:02d}", "ts", ("Plastic", "Glass")[i % 2], 10.0 + i,
+             ("Recycle", "Compost")[i % 2], f"u{i % 3}") for i in range(n)]
+
+
+def insert_entries(conn, rows):
+    conn.executemany(
+        "INSERT INTO entries (item, amount, date, ts, material, points, bin, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+
+
+def test_versions_are_sequential():
+    assert [v for v, _, _ in app.MIGRATIONS] == list(range(1, len(app.MIGRATIONS) + 1))
+    assert app.SCHEMA_VERSION == app.MIGRATIONS[-1][0]
+
+
+def test_fresh_database_is_migrated_once(empty_db):
+    conn = app.get_pool().acquire()
+    try:
+        assert app.migrate(conn) == [v for v, _, _ in app.MIGRATIONS]
+        assert app.schema_version(conn) == app.SCHEMA_VERSION
+        assert app.migrate(conn) == []
+    finally:
+        conn.close()
+
+
+def test_init_db_without_auto_migrate_leaves_schema_alone(empty_db, monkeypatch):
+    monkeypatch.setitem(app.app.config, "DB_AUTO_MIGRATE", False)
+    assert app.init_db() is False
+    conn = app.get_pool().acquire()
+    try:
+        assert app.schema_version(conn) == 0
+        app.migrate(conn)
+    finally:
+        conn.close()
+    assert app.init_db() is True
+
+
+def test_upgrade_builds_aggregates_from_existing_entries(empty_db):
+    conn = app.get_pool().acquire()
+    try:
+        # entries written before the aggregate tables and their triggers existed
+        app.migrate(conn, target=3)
+        insert_entries(conn, entries_rows(30))
+        conn.commit()
+        assert app.migrate(conn) == list(range(4, app.SCHEMA_VERSION + 1))
+
+        points = {r["user_id"]: (r["total_points"], r["entry_count"])
+                  for r in conn.execute("SELECT * FROM user_points")}
+        expected = {r[0]: (r[1], r[2]) for r in conn.execute(
+            "SELECT user_id, SUM(points), COUNT(1) FROM entries GROUP BY user_id")}
+        assert points == expected
+        daily = conn.execute("SELECT SUM(entry_count) FROM rollup_daily WHERE user_id = ''").fetchone()[0]
+        assert daily == 30
+    finally:
+        conn.close()
@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/api/entries", "/api/listings/others"])
+@pytest.mark.parametrize("query, param", [("limit=abc", "limit"), ("after_id=x", "after_id"), ("limit=10&after_id=1.5", "after_id")])
+def test_page_args_reject_non_integers(client, path, query, param):
+    resp = client.get(f"{path}?{query}")
+    assert resp.status_code == 400
+    assert param in resp.get_json()["error"]
+
+
+@pytest.mark.parametrize("path, key", [("/api/entries", "entries"), ("/api/listings/others", "listings")])
+def test_page_args_accept_blank_and_integers(client, path, key):
+    assert key in client.get(f"{path}?limit=&after_id=").get_json()
+    page = client.get(f"{path}?limit=5&after_id=0").get_json()
+    assert page[key] == [] and page["next_after_id"] is None
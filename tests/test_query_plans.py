@@ -0,0 +1,15 @@
+import app
+
+
+def test_hot_queries_use_indexes(conn):
+    assert app.check_query_plans(conn) == []
+
+
+def test_hot_queries_use_indexes_without_fts(db, monkeypatch):
+    monkeypatch.setattr(app, "fts5_trigram_available", lambda: False)
+    conn = app.get_db_connection()
+    try:
+        assert app._fts_ready is False
+        assert app.check_query_plans(conn) == []
+    finally:
+        conn.close()
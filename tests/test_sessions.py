@@ -0,0 +1,64 @@
+import time
+import types
+from datetime import timedelta
+
+import pytest
+from flask import Flask, jsonify, session
+
+import app
+
+
+def make_app(backend, tmp_path):
+    session_app = Flask(f"test_{backend}")
+    session_app.secret_key = "test"
+    session_app.config["SESSION_PERMANENT"] = True
+    session_app.config["DB_POOL_SIZE"] = 2
+    session_app.config["DB_BUSY_TIMEOUT_MS"] = 5000
+    session_app.permanent_session_lifetime = timedelta(minutes=10)
+    if backend == "sqlite":
+        session_app.session_interface = app.SqliteSessionInterface(session_app, str(tmp_path / "sessions.db"), 0)
+    else:
+        session_app.session_interface = app.MemorySessionInterface(session_app, 0)
+
+    @session_app.route("/read")
+    def read():
+        return jsonify(count=session.get("count"))
+
+    @session_app.route("/write")
+    def write():
+        session["count"] = session.get("count", 0) + 1
+        return jsonify(count=session["count"])
+
+    return session_app
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Session expiry reads app.time.time(); this moves it without sleeping."""
+    now = [time.time()]
+    monkeypatch.setattr(app, "time", types.SimpleNamespace(
+        time=lambda: now[0], monotonic=time.monotonic, perf_counter=time.perf_counter))
+    return now
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_session_write_read_expire(backend, tmp_path, clock):
+    session_app = make_app(backend, tmp_path)
+    store = session_app.session_interface
+    client = session_app.test_client()
+
+    assert client.get("/write").get_json() == {"count": 1}
+    assert client.get("/write").get_json() == {"count": 2}
+    assert client.get("/read").get_json() == {"count": 2}
+    store_id = store.key_prefix + client.get_cookie("session").value
+    assert store._load(store_id) is not None
+
+    clock[0] += 11 * 60
+    assert client.get("/read").get_json() == {"count": None}
+    # the next write sweeps the expired row and starts a fresh session
+    other = session_app.test_client()
+    assert other.get("/write").get_json() == {"count": 1}
+    assert store._load(store_id) is None
+
+    if backend == "sqlite":
+        store.pool.close_all()
@@ -0,0 +1,8 @@
+from conftest import new_user
+
+
+def test_bulk_swipes_rejects_non_object_bodies(client):
+    new_user(client)
+    for body in ("[1, 2]", '"swipes"', "3", "null"):
+        resp = client.post("/api/match/swipes", data=body, content_type="application/json")
+        assert resp.status_code == 400, body
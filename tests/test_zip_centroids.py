@@ -0,0 +1,37 @@
+import app
+
+
+def test_zip_centroid_lookup():
+    centroids = app.get_zip_centroids()
+    lat, lon = centroids.lookup("10001")
+    assert app.haversine_km(lat, lon, 40.75, -74.0) < 5
+    assert centroids.lookup("10001-1234") == (lat, lon)
+    assert centroids.lookup("00000") is None
+    assert centroids.lookup("1000") is None
+    assert centroids.lookup("") is None
+
+
+def test_resolve_location_prefers_explicit_coordinates():
+    assert app.resolve_location("10001", 1.0, 2.0) == (1.0, 2.0)
+    assert app.resolve_location("10001", None, 2.0) == app.get_zip_centroids().lookup("10001")
+    assert app.resolve_location("", None, None) == (None, None)
+
+
+def test_me_fills_coordinates_from_zip(client):
+    me = client.post("/api/me", json={"display_name": "a", "zip": "10001"}).get_json()["me"]
+    assert (me["lat"], me["lon"]) == app.get_zip_centroids().lookup("10001")
+
+
+def test_zip_only_rows_are_backfilled(empty_db):
+    conn = app.get_pool().acquire()
+    try:
+        app.migrate(conn, target=9)
+        conn.execute("INSERT INTO users (id, zip, created_ts) VALUES ('zip-only', '10001', 'x')")
+        conn.execute("INSERT INTO users (id, zip, created_ts) VALUES ('unknown-zip', '00000', 'x')")
+        conn.commit()
+        app.migrate(conn)
+        rows = {r["id"]: (r["lat"], r["lon"]) for r in conn.execute("SELECT id, lat, lon FROM users")}
+    finally:
+        conn.close()
+    assert rows["zip-only"] == app.get_zip_centroids().lookup("10001")
+    assert rows["unknown-zip"] == (None, None)